@@ -1,110 +1,199 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
+import time
 from dotenv import load_dotenv
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph
-from reportlab.pdfgen import canvas
-import io
-from doctor_dashboard  import doctor_dashboard
-# Load Firebase credentials
+from report_cache import get_report_cache
+from criteria import inclusion_criteria, exclusion_criteria, exclusion_keys, response_keys
+from screening import conclude
+from response_codec import convert_legacy, encode_document, is_legacy, migrate_legacy
+from data_access import (
+    QA_PAGE_SIZE, find_duplicates, get_db, get_nurse_ids, get_patient_index, get_qa_view, get_questions_page,
+    get_screening_stats, raise_question,
+)
+from patient_index import normalize
+from patient_ids import patient_id_error
+from retrieval import get_assistant
+from qa_live import watch_pages
+from question_dedup import numbers
+from pagination import cursor_pager, page_cursor
+from concurrent_reads import gather
+from drafts import DraftAutosaver, load_draft
+from submission_queue import get_submission_queue
+from instrumentation import admin_panel, track_fragment, track_page, track_rerun
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 load_dotenv()
-firebase_credentials_path = os.getenv('VARIABLE')
-
-# Initialize Firebase
-if not firebase_admin._apps:
-    cred = credentials.Certificate(firebase_credentials_path)
-    firebase_admin.initialize_app(cred)
-
-# Initialize Firestore
-db = firestore.client()
-
-# Import criteria and explanations from original script
-inclusion_criteria = [
-    "Is the subject aged between 18 and 75 years at Screening?",
-    "Has informed consent been obtained?",
-    "Is the infection (HABP/VABP ± ccBSI) caused by a suspected or documented carbapenem-resistant Gram-negative pathogen?",
-    "Does the subject have CrCL (>30 mL/min)?",
-
-    # HABP/VABP Specific Inclusion Criteria
-    "Does the subject have hospital-acquired or ventilator-associated bacterial pneumonia with or without concurrent bloodstream infection?",
-    "Does the subject have a new onset or worsening of pulmonary symptoms, such as cough, dyspnea, tachypnea (e.g., respiratory rate > 25 breaths per minute), or expectorated sputum production?",
-    "Is there a need for mechanical ventilation or an increase in ventilator support to enhance oxygenation?",
-    "Has the subject's partial pressure of oxygen dropped below 60 mmHg while breathing room air, or has the PaO2/FiO2 ratio worsened?",
-    "Is there a new onset or increase in suctioned respiratory secretions?",
-    "Does the subject have documented fever (e.g., core body temperature ≥ 38°C) or hypothermia (e.g., core body temperature ≤ 35°C)?",
-    "Does the subject have leukocytosis with a WBC count ≥ 10,000 cells/mm³, leukopenia with a WBC count ≤ 4,500 cells/mm³, or more than 15% immature neutrophils (bands) on a peripheral blood smear?",
-
-    # cIAI Specific Inclusion Criteria
-    "Does the subject meet specific criteria for cIAI inclusion?",
-    "Does the subject have cholecystitis with gangrenous rupture or infection progression beyond the gallbladder wall?",
-    "Does the subject have diverticular disease with perforation or abscess?",
-    "Does the subject have appendiceal perforation or a peri-appendiceal abscess?",
-    "Does the subject have acute gastric or duodenal perforation (if operated on more than 24 hours after perforation)?",
-    "Does the subject have traumatic perforation of the intestines (if operated on more than 12 hours after perforation)?",
-    "Does the subject have secondary peritonitis (excluding spontaneous peritonitis associated with cirrhosis and chronic ascites)?",
-    "Does the subject have an intra-abdominal abscess with evidence of intraperitoneal involvement?",
-
-    # ccBSI Specific Inclusion Criteria
-    "Does the subject have one or more positive blood cultures identifying a carbapenem-resistant Gram-negative pathogen that is consistent with the subject's clinical condition?",
-    "Does the subject have signs or symptoms associated with bacteremia?",
-
-    # cUTI or AP Specific Inclusion Criteria
-    "Is there a confirmed cUTI or AP with or without concurrent bloodstream infection?",
-    "Has the subject had an indwelling urinary catheter or recent instrumentation of the urinary tract (within 14 days prior to Screening)?",
-    "Does the subject have urinary retention with 100 mL or more of residual urine after voiding (neurogenic bladder)?",
-    "Does the subject have obstructive uropathy (e.g., nephrolithiasis or fibrosis)?",
-    "Does the subject have azotemia caused by intrinsic renal disease (BUN and creatinine values greater than normal clinical laboratory values)?",
-    "Does the subject present with at least two signs or symptoms: chills, rigors, or warmth associated with fever (temperature ≥ 38°C); flank pain or suprapubic/pelvic pain; nausea or vomiting; dysuria, urinary frequency, or urgency; or costovertebral angle tenderness on physical examination?",
-    "Does the subject's urinalysis show evidence of pyuria, demonstrated by either a positive dipstick analysis for leukocyte esterase or ≥ 10 WBCs/µL in unspun urine, or ≥ 10 WBCs/high-power field in spun urine?",
-    "Did the subject have a positive urine culture within 48 hours before WCK 5222 treatment initiation, showing ≥ 10⁵ CFU/mL of a carbapenem-resistant Gram-negative uropathogen?",
-    "Is the subject receiving antibiotic prophylaxis for cUTI but presenting with signs and symptoms consistent with an active new cUTI?"
-]
-
-exclusion_criteria = [
-    "Does the subject have any hypersensitivity or allergic reactions to B-lactam antibiotics?",
-    "Does the subject have any pre-existing neurological disorders?",
-    "Has the subject received any prior treatment with antibiotics effective against carbapenem-resistant Gram-negative bacteria?",
-    "Does the subject have severe sepsis or septic shock requiring high-level vasopressors?",
-    "Does the subject have a Cr <30 mL/min at screening?",
-    "Is there a history of chronic kidney disease?",
-    "Are there any co-infections with specific pathogens (e.g., Gram-positive bacteria, Aspergillosis)?",
-    "Is there a central nervous system infection present?",
-    "Does the subject have infections requiring extended antibiotic treatment (e.g., bone infections)?",
-    "Does the subject have cystic fibrosis or severe bronchiectasis?",
-    "Does the subject have severe neutropenia?",
-    "Has the subject tested positive for pregnancy or is lactating?",
-    "Does the subject have a Sequential Organ Failure Assessment (SOFA) score greater than 6?",
-    "Is there any condition that might compromise safety or data quality according to the investigator?",
-    "Has the subject received any investigational drug or device within 30 days prior to entry?",
-    "Has the subject been previously enrolled in this study or received WCK 5222?",
-    "Is the subject receiving dialysis, continuous renal replacement therapy, or ECMO?",
-    "Does the subject have myasthenia gravis or any other neuromuscular disorder?",
-    "Does the subject have severe liver disease?"
-]
 
+# Number of patients listed per page on the Reports tab
+REPORTS_PAGE_SIZE = int(os.getenv('REPORTS_PAGE_SIZE', '25'))
+
+# Rendered PDFs are kept in memory, shared across sessions, up to this many bytes
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+report_cache = get_report_cache(PDF_CACHE_MAX_BYTES)
+
+# BM25 score above which an earlier doctor answer is treated as answering the question
+ANSWER_MATCH_SCORE = float(os.getenv('ANSWER_MATCH_SCORE', '5'))
+
+# Logged-in IDs that can see the performance panel in the sidebar
+ADMIN_IDS = {i.strip() for i in os.getenv('ADMIN_IDS', '').split(',') if i.strip()}
+
+# Logged-in IDs that can export other nurses' reports; everyone else only their own
+COORDINATOR_IDS = {i.strip() for i in os.getenv('COORDINATOR_IDS', '').split(',') if i.strip()}
+
+# Seconds between automatic draft writes while a nurse fills in the criteria
+DRAFT_AUTOSAVE_INTERVAL = int(os.getenv('DRAFT_AUTOSAVE_INTERVAL', '10'))
+
+
+# Radio options as shown, and the lower-case form stored in 'responses'
+RESPONSE_OPTIONS = ["Yes", "No", "Not Sure"]
 
 def handle_response(question, nurse_id):
-    response = st.radio(f"{question}", ["Yes", "No", "Not Sure"], key=f"response_{question}")
+    response = st.radio(f"{question}", RESPONSE_OPTIONS, key=f"response_{question}")
     return "Response recorded.", response.lower()
 
+def restore_draft(nurse_id, patient_id, drafts):
+    # Seed the form once per nurse/patient from any saved draft
+    if st.session_state.get('draft_restored_for') == (nurse_id, patient_id):
+        return
+    st.session_state.draft_restored_for = (nurse_id, patient_id)
+
+    draft = load_draft(get_db(), nurse_id, patient_id)
+    if not draft:
+        return
+    responses = draft.get('responses', {})
+    options = {option.lower(): option for option in RESPONSE_OPTIONS}
+    questions = inclusion_criteria + exclusion_criteria
+    for key, question in zip(response_keys, questions):
+        answer = responses.get(key)
+        if answer in options:
+            st.session_state[f"response_{question}"] = options[answer]
+    if draft.get('subject_name'):
+        st.session_state.subject_name = draft['subject_name']
+    drafts.mark_saved(nurse_id, patient_id, draft.get('subject_name'), responses)
+    st.info("Restored your saved draft for this patient.")
+
 def display_chat():
     if 'messages' not in st.session_state:
         st.session_state.messages = [
             {"role": "assistant", "content": "Hello! I'm here to help you with the eligibility criteria assessment. Feel free to ask any questions."}
         ]
 
+    # Handle a new prompt before rendering so the reply shows up in this run
+    if prompt := st.chat_input("Ask a question..."):
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        response, answered = answer_from_index(prompt)
+        st.session_state.messages.append({"role": "assistant", "content": response})
+        # Only offer to involve the doctor when no earlier answer matched
+        st.session_state.pending_question = None if answered else prompt
+
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.write(message["content"])
 
-    if prompt := st.chat_input("Ask a question..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        response = "This is a placeholder response. The actual question-answering logic will be implemented later."
-        st.session_state.messages.append({"role": "assistant", "content": response})
+    if st.session_state.get('pending_question'):
+        if st.button("Raise this question with the doctor"):
+            raise_question(st.session_state.pending_question)
+            st.session_state.pending_question = None
+            st.session_state.messages.append(
+                {"role": "assistant", "content": "Your question has been sent to the doctor. The answer will appear under FAQ and Raised Queries."}
+            )
+            st.rerun()
+
+def answer_from_index(prompt):
+    # Returns (response text, whether a prior doctor answer matched)
+    assistant = get_assistant()
+    assistant.sync(get_qa_view())
+    results = assistant.ask(prompt)
+
+    parts = []
+    matched = [payload for score, payload in results['answers'] if score >= ANSWER_MATCH_SCORE]
+
+    # A close wording with different numbers ("aged 17" / "aged 76") is a
+    # different question, so it's only listed as possibly related. So are
+    # rewordings found by the duplicate check; neither is used as an answer.
+    values = numbers(prompt)
+    answers = [payload for payload in matched if numbers(payload['question']) == values]
+    shown = {payload['id'] for payload in answers}
+    related = [{**payload, 'answered': True} for payload in matched if payload['id'] not in shown]
+    shown.update(payload['id'] for payload in related)
+    related += [item for item in find_duplicates(prompt) if item['id'] not in shown]
+
+    if answers:
+        parts.append("This looks like it has been answered by a doctor before:")
+        for payload in answers:
+            parts.append(f"**Q:** {payload['question']}\n\n**A:** {payload['answer']}")
+    if results['criteria']:
+        parts.append("Related criteria:")
+        parts.append("\n".join(f"- **{payload['label']}:** {payload['text']}" for _, payload in results['criteria']))
+    if related:
+        parts.append("Possibly related questions (check they really ask the same thing):")
+        parts.append("\n".join(
+            f"- {item['question']} ({'answered, see FAQ and Raised Queries' if item.get('answered') else 'waiting for the doctor'})"
+            for item in related
+        ))
+    if not parts:
+        parts.append("I couldn't find anything related in the criteria or earlier answers.")
+    if not answers:
+        parts.append("If this doesn't answer your question, you can raise it with the doctor.")
+    return "\n\n".join(parts), bool(answers)
+
+@track_page("Clinical Test")
+# The criteria live in a fragment, so clicking a radio button reruns only
+# the form, not the whole page. Every run queues the changed answers and the
+# timer run writes whatever is still waiting once the interval has passed.
+@st.fragment(run_every=DRAFT_AUTOSAVE_INTERVAL)
+@track_fragment("assessment")
+def assessment_form(nurse_id, patient_id, drafts):
+    from firebase_admin import firestore
+
+    subject_name = st.text_input("Enter the name of the subject:", key="subject_name")
+
+    patient_data = {
+        'nurse_id': nurse_id,
+        'patient_id': patient_id,
+        'subject_name': subject_name,
+        'responses': {},
+        'conclusion': '',
+        'submitted_at': firestore.SERVER_TIMESTAMP,
+    }
+
+    st.subheader("Inclusion Criteria")
+    for idx, question in enumerate(inclusion_criteria, start=1):
+        result, response = handle_response(question, nurse_id)
+        patient_data['responses'][f'inclusion_{idx}'] = response  # Save response in the dictionary
+
+    st.subheader("Exclusion Criteria")
+    for idx, question in enumerate(exclusion_criteria, start=len(inclusion_criteria) + 1):
+        result, response = handle_response(question, nurse_id)
+        patient_data['responses'][f'exclusion_{idx}'] = response  # Save response in the dictionary
+
+    draft_col, submit_col = st.columns(2)
+    with draft_col:
+        save_draft = st.button("Save Draft Now")
+    with submit_col:
+        submitted = st.button("Submit Patient Data")
+
+    id_error = patient_id_error(patient_id)
+    if (save_draft or submitted) and id_error:
+        st.warning(id_error)
+    elif submitted:
+        patient_data['conclusion'] = conclude(patient_data['responses'])
+
+        # Journal locally and return; the background worker writes it to
+        # Firestore and deletes the draft in the same batch
+        get_submission_queue(get_db()).submit(encode_document(patient_data))
+        drafts.mark_saved(nurse_id, patient_id, subject_name, patient_data['responses'])
+
+        st.success("Patient data has been saved and will sync to the server shortly.")
+        st.write(f"Conclusion: {patient_data['conclusion']}")
+    elif id_error is None:
+        drafts.save(nurse_id, patient_id, subject_name, patient_data['responses'], force=save_draft)
+        last_write = drafts.last_write(nurse_id, patient_id)
+        if last_write:
+            saved_ago = int(time.monotonic() - last_write)
+            st.caption(f"Draft saved automatically {saved_ago}s ago.")
+        else:
+            st.caption(f"Answers are saved as a draft automatically every {DRAFT_AUTOSAVE_INTERVAL}s.")
+
 def run_clinical_test():
     # Create two columns for split layout
     col1, col2 = st.columns([0.6, 0.4])
@@ -113,194 +202,101 @@ def run_clinical_test():
         st.title("Eligibility Criteria Assessment")
         
         nurse_id = st.session_state.nurse_id
-        subject_name = st.text_input("Enter the name of the subject:")
         patient_id = st.text_input("Enter the ID of the patient:")
 
-        patient_data = {
-            'nurse_id': nurse_id,
-            'patient_id': patient_id,
-            'subject_name': subject_name,
-            'responses': {},
-            'conclusion': '',
-        }
-
-        # Initialize flags
-        unconcluded_flag = False
-        exclusion_flag = False
-
-        st.subheader("Inclusion Criteria")
-        for idx, question in enumerate(inclusion_criteria, start=1):
-            print("\n" + question)
-            result, response = handle_response(question, nurse_id)
-            print(result,response)
-            patient_data['responses'][f'inclusion_{idx}'] = response  # Save response in the dictionary
-            if response == "not sure":
-                unconcluded_flag = True
-        
-        st.subheader("Exclusion Criteria")
-        for idx, question in enumerate(exclusion_criteria, start=len(inclusion_criteria) + 1):
-            print("\n" + question)
-            result, response = handle_response(question, nurse_id)
-            print(result,response)
-            patient_data['responses'][f'exclusion_{idx}'] = response  # Save response in the dictionary
-            if response == "not sure":
-                unconcluded_flag = True
-            if response == "yes":
-                exclusion_flag = True
-                #exclusion_reasons.append(question)
-
-        if st.button("Submit Patient Data"):
-            if unconcluded_flag:
-                patient_data['conclusion'] = "Unconcluded"
-            elif exclusion_flag:
-                patient_data['conclusion'] = "Excluded"
-            else:
-                patient_data['conclusion'] = "Eligible"
+        drafts = DraftAutosaver(get_db(), st.session_state, DRAFT_AUTOSAVE_INTERVAL)
+        if patient_id_error(patient_id) is None:
+            restore_draft(nurse_id, patient_id, drafts)
 
-            # Store in Firestore
-            patients_ref = db.collection('PATIENTS')
-            patients_ref.document(patient_id).set(patient_data)
-            
-            st.success("Patient data has been stored successfully!")
-            st.write(f"Conclusion: {patient_data['conclusion']}")
+        assessment_form(nurse_id, patient_id, drafts)
 
     with col2:
         st.title("Criteria Assistant")
         display_chat()
 
-
-def download_report(patient_id, nurse_id):
+def download_report(patient_info, nurse_id):
     try:
-        # Query patient data based on patient_id and nurse_id
-        patient_ref = db.collection('PATIENTS').where('patient_id', '==', patient_id).where('nurse_id', '==', nurse_id)
-        patient_data = patient_ref.stream()  # This returns a generator
-
-        # If the query returns results
-        found_patient = False
-        for doc in patient_data:
-            found_patient = True
-            patient_info = doc.to_dict()
-            conclusion = patient_info.get('conclusion', '')
-
-            # Check if the patient's conclusion is 'Unconcluded'
-            if conclusion == "Unconcluded":
-                st.warning("Cannot generate report for unconcluded patient.")
-                break  # Exit the loop once warning is shown
-
-            # Otherwise, generate the report PDF
-            pdf_bytes = generate_pdf(patient_info, nurse_id, patient_id)
-
-            # Provide the download button for the generated PDF
-            st.download_button(
-                label=f"Download Report for Patient {patient_id}",
-                data=pdf_bytes,
-                file_name=f"patient_{patient_id}_report.pdf",
-                mime="application/pdf"
-            )
-        
-        #if not found_patient: -->this will give other nurse_id records as not found!! so 
-            #st.error(f"Patient with ID {patient_id} not found.") removed it!!!
-    
-    except Exception as e:
-        st.error(f"Error generating PDF: {e}")
-
-def generate_pdf(patient_data, nurse_id, patient_id):
-    # Create PDF in memory
-    pdf_buffer = io.BytesIO()
-
-    try:
-        c = canvas.Canvas(pdf_buffer, pagesize=letter)
-        width, height = letter
-        c.setFont("Helvetica", 14)
-
-        # Creating styles for alignment
-        styles = getSampleStyleSheet()
-        style_normal = styles["Normal"]
-        style_normal.fontName = "Helvetica"
-        style_normal.fontSize = 14
-
-        # Adding content to the PDF using Paragraph for better alignment
-        c.drawString(100, height - 50, f"Patient Report for ID: {patient_id}")
-        c.drawString(100, height - 70, f"Nurse ID: {nurse_id}")
-        c.drawString(100, height - 90, f"Name: {patient_data.get('subject_name', 'N/A')}")
-        c.drawString(100, height - 110, f"Patient ID: {patient_id}")
-
-        conclusion = patient_data.get('conclusion', '')
-        
-        # List of exclusion questions mapped to their IDs in Firestore
-        exclusion_questions = {
-            "exclusion_31": "Does the subject have any hypersensitivity or allergic reactions to B-lactam antibiotics?",
-            "exclusion_32": "Does the subject have any pre-existing neurological disorders?",
-            "exclusion_33": "Has the subject received any prior treatment with antibiotics effective against carbapenem-resistant Gram-negative bacteria?",
-            "exclusion_34": "Does the subject have severe sepsis or septic shock requiring high-level vasopressors?",
-            "exclusion_35": "Does the subject have a Cr <30 mL/min at screening?",
-            "exclusion_36": "Is there a history of chronic kidney disease?",
-            "exclusion_37": "Are there any co-infections with specific pathogens (e.g., Gram-positive bacteria, Aspergillosis)?",
-            "exclusion_38": "Is there a central nervous system infection present?",
-            "exclusion_39": "Does the subject have infections requiring extended antibiotic treatment (e.g., bone infections)?",
-            "exclusion_40": "Does the subject have cystic fibrosis or severe bronchiectasis?",
-            "exclusion_41": "Does the subject have severe neutropenia?",
-            "exclusion_42": "Has the subject tested positive for pregnancy or is lactating?",
-            "exclusion_43": "Does the subject have a Sequential Organ Failure Assessment (SOFA) score greater than 6?",
-            "exclusion_44": "Is there any condition that might compromise safety or data quality according to the investigator?",
-            "exclusion_45": "Has the subject received any investigational drug or device within 30 days prior to entry?",
-            "exclusion_46": "Has the subject been previously enrolled in this study or received WCK 5222?",
-            "exclusion_47": "Is the subject receiving dialysis, continuous renal replacement therapy, or ECMO?",
-            "exclusion_48": "Does the subject have myasthenia gravis or any other neuromuscular disorder?",
-            "exclusion_49": "Does the subject have severe liver disease?"
-        }
-
-        # Check if the patient is excluded
-        if conclusion == "Excluded":
-            exclusion_criteria_violations = []
-            
-            # Get the responses from the 'responses' field
-            responses = patient_data.get('responses', {})
-
-            # Check the responses for each exclusion question and add to the list if 'yes'
-            for exclusion_key, exclusion_question in exclusion_questions.items():
-                response = responses.get(exclusion_key, "").lower()
-                if response == "yes":
-                    exclusion_criteria_violations.append(f"Question: {exclusion_question}")
-
-            # If there are any violations, add them to the PDF
-            if exclusion_criteria_violations:
-                c.drawString(100, height - 140, "Exclusion Criteria Violations:")
-                y_position = height - 160
-
-                # Using Paragraph for better text wrapping
-                for violation in exclusion_criteria_violations:
-                    para = Paragraph(violation, style_normal)
-                    para_width = width - 200  # Set max width to fit the page
-                    para_height = para.wrap(para_width, 100)[1]  # Wrap the text
-                    para.drawOn(c, 100, y_position - para_height)
-                    y_position -= (para_height + 10)  # Adjust y-position after each paragraph
-
-        elif conclusion == "Eligible":
-            para = Paragraph("Patient is eligible.", style_normal)
-            para_width = width - 200
-            para_height = para.wrap(para_width, 100)[1]
-            para.drawOn(c, 100, height - 140 - para_height)
-
-        # Save the PDF to buffer
-        c.save()
-        pdf_buffer.seek(0)
-        return pdf_buffer.getvalue()
+        from reports import generate_pdf
+
+        patient_id = patient_info.get('patient_id', 'N/A')
+        conclusion = patient_info.get('conclusion', '')
+
+        # Check if the patient's conclusion is 'Unconcluded'
+        if conclusion == "Unconcluded":
+            st.warning(f"Cannot generate report for unconcluded patient {patient_id}.")
+            return
+
+        # Rendered (or taken from the shared cache) only when the nurse clicks,
+        # on Streamlit's download thread; the click doesn't rerun the page
+        st.download_button(
+            label=f"Download Report for Patient {patient_id}",
+            data=lambda: report_cache.get_or_render(
+                patient_info, lambda: generate_pdf(patient_info, nurse_id, patient_id)
+            ),
+            file_name=f"patient_{patient_id}_report.pdf",
+            mime="application/pdf",
+            on_click="ignore",
+            key=f"download_{patient_id}"
+        )
 
     except Exception as e:
         st.error(f"Error generating PDF: {e}")
-        raise
 
+def fetch_nurse_patients_page(nurse_id, page_size, cursor=None):
+    # One query scoped to the nurse, ordered by patient_id so it can be paginated
+    # with a cursor (needs the nurse_id + patient_id index in firestore.indexes.json).
+    db = get_db()
+    query = db.collection('PATIENTS').where('nurse_id', '==', nurse_id).order_by('patient_id')
+    if cursor is not None:
+        query = query.start_after({'patient_id': cursor})
+
+    # Ask for one extra document to know whether there is a next page
+    snapshots = list(query.limit(page_size + 1).stream())
+    has_next = len(snapshots) > page_size
+    snapshots = snapshots[:page_size]
+
+    # Convert any documents still in the old responses-map format
+    migrate_legacy(db, snapshots)
+    return [snapshot.to_dict() for snapshot in snapshots], has_next
+
+def fetch_index_page(index, patient_ids, cursor=None):
+    patients, has_next = index.page(patient_ids, REPORTS_PAGE_SIZE, cursor)
+
+    # Convert any shown documents still in the old responses-map format; the
+    # listener brings the converted versions into the index
+    db = get_db()
+    convert_legacy(db, [db.collection('PATIENTS').document(p['patient_id']) for p in patients if is_legacy(p)])
+    return patients, has_next
+
+@track_page("Download Reports")
 def download_reports():
     st.title("Patient Reports")
-    
-    # Retrieve patient data
-    patients_ref = db.collection('PATIENTS')
-    patients = patients_ref.stream()
+
+    nurse_id = st.session_state.nurse_id
+    search = st.text_input("Search by patient ID or subject name", key="reports_search")
+
+    # Served from the nurse's in-memory index once it has synced; until then
+    # (or if it can't start) fall back to paged queries without search
+    index = get_patient_index(nurse_id)
+    if index is not None and index.ready:
+        matches = index.matching_ids(search)
+        st.caption(f"{len(matches)} of {len(index)} patients")
+        fetch_page = lambda cursor: fetch_index_page(index, matches, cursor)
+    else:
+        if search:
+            st.info("Search will be available once the patient list has loaded.")
+        fetch_page = lambda cursor: fetch_nurse_patients_page(nurse_id, REPORTS_PAGE_SIZE, cursor)
+
+    # Pages are keyed by the last patient_id of the previous page
+    patients = cursor_pager(
+        "reports_pages",
+        fetch_page,
+        lambda patient: patient.get('patient_id'),
+        scope=(nurse_id, normalize(search)),
+    )
 
     patient_data = []
-    for patient in patients:
-        data = patient.to_dict()
+    for data in patients:
         patient_data.append({
             'Patient ID': data.get('patient_id', 'N/A'),
             'Subject Name': data.get('subject_name', 'N/A'),
@@ -308,73 +304,218 @@ def download_reports():
             'Download': data.get('patient_id', 'N/A')
         })
 
-    df = pd.DataFrame(patient_data)
-    st.dataframe(df)
+    if patient_data:
+        import pandas as pd
 
-    # Add download buttons for each patient
-    for patient_id in df['Patient ID']:
-        nurse_id = st.session_state.nurse_id
-        download_report(patient_id, nurse_id)
-def display_faq_and_queries():
-    st.title("📚 FAQ and Raised Queries")
+        df = pd.DataFrame(patient_data)
+        st.dataframe(df)
+    else:
+        st.write("No patients found.")
 
-    # Fetch FAQs from the DOCTOR collection
-    doctor_doc_ref = db.collection("DOCTOR").document("1")  # Adjust the document path as needed
-    doctor_data = doctor_doc_ref.get()  # Use get() to retrieve the document
+    # Add download buttons for each patient, reusing the documents fetched above
+    for patient_info in patients:
+        download_report(patient_info, nurse_id)
 
-    answered_qs = []
-    raised_qs = []
+    download_all_reports(nurse_id)
 
-    # Create a map to store answers for easy lookup
-    answers_map = {}
+def download_all_reports(nurse_id):
+    from bulk_export import EXPORTABLE_CONCLUSIONS, remove_stale_exports
 
-    if doctor_data.exists:
-        data = doctor_data.to_dict()
-        questions = data.get("qn", [])  # Assuming 'qn' is a list of questions
-        answers = data.get("ans", {})  # Assuming 'ans' is a map of question-answer pairs
+    remove_stale_exports()
+    with st.expander("Download all reports as ZIP"):
+        if nurse_id in COORDINATOR_IDS:
+            export_nurse = st.text_input("Nurse ID (leave blank for all nurses)", value=nurse_id, key="export_nurse").strip()
+        else:
+            export_nurse = nurse_id
+        conclusions = st.multiselect("Conclusion", EXPORTABLE_CONCLUSIONS, default=EXPORTABLE_CONCLUSIONS, key="export_conclusions")
+        start_date = end_date = None
+        if st.checkbox("Filter by submission date", key="export_by_date"):
+            date_range = st.date_input("Submitted between", value=[], key="export_dates")
+            if len(date_range) == 2:
+                start_date, end_date = date_range
+
+        if st.button("Build ZIP", disabled=not conclusions):
+            build_reports_zip(export_nurse, conclusions, start_date, end_date)
+
+        # The archive stays on disk between reruns; Streamlit only reads it
+        # when the nurse actually clicks download
+        export = st.session_state.get('export_zip')
+        if export is not None and os.path.exists(export['path']):
+            st.download_button(
+                label=f"Download {export['count']} reports (ZIP)",
+                data=lambda path=export['path']: read_file(path),
+                file_name="patient_reports.zip",
+                mime="application/zip",
+                key="download_all_zip"
+            )
 
-        # Populate the answers map
-        for question in questions:
-            if question in answers:  # Check if the question has an answer
-                answered_qs.append((question, answers[question]))  # Append as a tuple
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
 
-        # Identify raised questions (those that are in questions but not in answers)
-        for question in questions:
-            if question not in answers:
-                raised_qs.append(question)
+def build_reports_zip(export_nurse, conclusions, start_date, end_date):
+    from bulk_export import build_export_query, export_reports_zip, new_export_file
 
-    # Display Answered Questions
+    query = build_export_query(get_db(), export_nurse, conclusions, start_date, end_date)
+    total = query.count().get()[0][0].value
+    if total == 0:
+        st.info("No reports match these filters.")
+        return
+
+    progress = st.progress(0.0, text=f"Rendering 0 of {total} reports...")
+
+    def on_progress(done):
+        progress.progress(min(done / total, 1.0), text=f"Rendering {done} of {total} reports...")
+
+    # Replace any archive this session built before
+    previous = st.session_state.pop('export_zip', None)
+    if previous is not None and os.path.exists(previous['path']):
+        os.remove(previous['path'])
+
+    # The archive is built on disk; documents are streamed straight into the pool
+    out, path = new_export_file()
+    with out as archive:
+        patients = (doc.to_dict() for doc in query.stream())
+        exported, failures = export_reports_zip(patients, archive, on_progress=on_progress)
+    progress.empty()
+    st.session_state.export_zip = {'path': path, 'count': exported}
+
+    if failures:
+        st.warning(
+            f"{len(failures)} report(s) could not be generated and were left out of the ZIP:\n\n"
+            + "\n".join(f"- Patient {patient_id}: {error}" for patient_id, error in failures)
+        )
+
+@track_page("FAQ and Raised Queries")
+def display_faq_and_queries():
+    st.title("📚 FAQ and Raised Queries")
+
+    # Rerun when the shared listener sees new questions or answers on the shown pages
+    answered_cursor, raised_cursor = page_cursor("faq_answered_pages"), page_cursor("faq_raised_pages")
+    view = get_qa_view()
+    if view is not None:
+        watch_pages(view, QA_PAGE_SIZE, [(True, answered_cursor), (False, raised_cursor)])
+
+    fetch_answered = lambda: get_questions_page(True, QA_PAGE_SIZE, answered_cursor)
+    fetch_raised = lambda: get_questions_page(False, QA_PAGE_SIZE, raised_cursor)
+    if view is not None and view.ready:
+        # Served from memory; extra threads would only add overhead
+        answered_page, raised_page = fetch_answered(), fetch_raised()
+    else:
+        # Both lists are independent, so query their current pages together
+        answered_page, raised_page = gather(fetch_answered, fetch_raised)
+
+    # Display Answered Questions, one page at a time
+    st.subheader("✅ Answered Questions")
+    answered_qs = cursor_pager(
+        "faq_answered_pages",
+        lambda cursor: answered_page,
+        lambda question: question['created_at'],
+    )
     if answered_qs:
-        st.subheader("✅ Answered Questions")
-        for question, answer in answered_qs:
-            st.write(f"**Q:** {question}")
-            st.write(f"**A:** {answer}")
+        for item in answered_qs:
+            st.write(f"**Q:** {item['question']}")
+            st.write(f"**A:** {item['answer']}")
     else:
         st.write("No answered questions available.")
 
     # Display Raised Questions
+    st.subheader("📌 Raised Questions")
+    raised_qs = cursor_pager(
+        "faq_raised_pages",
+        lambda cursor: raised_page,
+        lambda question: question['created_at'],
+    )
     if raised_qs:
-        st.subheader("📌 Raised Questions")
-        for question in raised_qs:
-            st.write(f"**Q:** {question}")
+        for item in raised_qs:
+            st.write(f"**Q:** {item['question']}")
     else:
         st.write("No raised questions available.")
+@st.fragment(run_every=5)
+@track_fragment("sync status")
+def show_sync_status():
+    # Pending count comes from the local journal, not Firestore
+    queue = get_submission_queue(get_db())
+    pending = queue.pending_count()
+    failed = queue.failed()
+    if pending:
+        st.warning(f"⏳ {pending} submission(s) waiting to sync")
+        if queue.last_error is not None:
+            st.caption(f"Last sync attempt failed: {queue.last_error}")
+    elif not failed:
+        st.caption("✅ All submissions synced")
+    if failed:
+        # Set aside after repeated failures; resubmitting the patient also retries
+        st.error(f"⚠️ {len(failed)} submission(s) could not be synced: " + ", ".join(p for p, _ in failed))
+        if st.button("Retry failed submissions"):
+            queue.retry_failed()
+
+@track_page("Statistics")
+def display_statistics():
+    import pandas as pd
+
+    st.title("📊 Screening Statistics")
+
+    # Summed from a fixed number of counter documents, whatever the trial size
+    stats = get_screening_stats()
+    if not stats.get('total'):
+        st.write("No screening data available yet.")
+        return
+
+    conclusions = stats.get('conclusions', {})
+    cols = st.columns(4)
+    cols[0].metric("Screened", stats.get('total', 0))
+    for col, conclusion in zip(cols[1:], ["Eligible", "Excluded", "Unconcluded"]):
+        col.metric(conclusion, conclusions.get(conclusion, 0))
+
+    st.subheader("Most frequent exclusion criteria")
+    exclusions = stats.get('exclusions', {})
+    fired = [
+        {'Criterion': f"{key}: {question}", 'Patients': exclusions.get(key, 0)}
+        for key, question in zip(exclusion_keys, exclusion_criteria)
+        if exclusions.get(key, 0) > 0
+    ]
+    if fired:
+        df = pd.DataFrame(fired).sort_values('Patients', ascending=False)
+        st.dataframe(df, hide_index=True)
+    else:
+        st.write("No exclusion criteria have been met yet.")
+
+    st.subheader("Screenings per nurse")
+    nurses = stats.get('nurses', {})
+    rows = [
+        {
+            'Nurse ID': nurse_id,
+            'Screened': counts.get('total', 0),
+            'Eligible': counts.get('Eligible', 0),
+            'Excluded': counts.get('Excluded', 0),
+            'Unconcluded': counts.get('Unconcluded', 0),
+        }
+        for nurse_id, counts in nurses.items()
+        if counts.get('total', 0) > 0
+    ]
+    st.dataframe(pd.DataFrame(rows).sort_values('Screened', ascending=False), hide_index=True)
+
 def main():
     st.set_page_config(page_title="Nurse Management App", page_icon="🏥", layout="wide")
 
+    # Time the whole rerun and attribute Firestore calls to this session
+    ctx = get_script_run_ctx()
+    with track_rerun(ctx.session_id if ctx else None):
+        render_app()
+
+def render_app():
     # Login Page
     if 'logged_in' not in st.session_state:
         st.title("Nurse Login")
         nurse_id = st.text_input("Enter Nurse ID")
         
         if st.button("Login"):
-            # Check nurse ID in Firestore
-            nurse_ref = db.collection('NURSE').document('nurse_ids')
-            nurse_data = nurse_ref.get()
+            # Check nurse ID against the cached allowlist
+            nurse_ids = get_nurse_ids()
 
-            if nurse_data.exists:
-                nurse_data = nurse_data.to_dict()
-                if nurse_id.strip() in nurse_data.get('nid', []):
+            if nurse_ids is not None:
+                if nurse_id.strip() in nurse_ids:
                     st.session_state.logged_in = True
                     st.session_state.nurse_id = nurse_id.strip()  # Initialize nurse_id
                     st.rerun()
@@ -384,9 +525,6 @@ def main():
                 st.error("Nurse data not found.")
 
             # Check if the entered nurse ID corresponds to a doctor
-            doctor_ref = db.collection("DOC").document("ID")  
-            doctor_data = doctor_ref.get()
-
             if nurse_id.strip()=='1004':
                 st.session_state.logged_in = True
                 st.session_state.nurse_id = nurse_id.strip()  # Initialize nurse_id
@@ -398,15 +536,19 @@ def main():
     # Main App
     if st.session_state.get('logged_in'):
         st.sidebar.title(f"Welcome, Nurse {st.session_state.nurse_id}")
+        with st.sidebar:
+            show_sync_status()
+        if st.session_state.nurse_id in ADMIN_IDS:
+            admin_panel(report_cache)
 
         # Check if the logged-in user is a doctor
         if st.session_state.get('is_doctor', False):  # Check if the user is a doctor
-            from doctor_dashboard import doctor_dashboard  # Import the doctor dashboard function
+            from doctor_dashboard import doctor_dashboard  # Imported only for the doctor's session
             doctor_dashboard()  # Call the doctor dashboard function
         else:
             # Existing nurse dashboard logic
             app_mode = st.sidebar.radio("Choose an option", 
-                                         ["Clinical Test", "Download Reports","FAQ and Raised Queries"])
+                                         ["Clinical Test", "Download Reports","FAQ and Raised Queries", "Statistics"])
             
             if app_mode == "Clinical Test":
                 run_clinical_test()  # Your existing function for clinical tests
@@ -414,6 +556,8 @@ def main():
                 download_reports()  # Your existing function for downloading reports
             elif app_mode == "FAQ and Raised Queries":
                 display_faq_and_queries()
+            elif app_mode == "Statistics":
+                display_statistics()
 
             if st.sidebar.button("Logout"):
                 st.session_state.logged_in = False
@@ -0,0 +1,12 @@
+# benchmarks/app_entry.py
+# Script handed to Streamlit's AppTest: runs app.py as the page would be run
+# by `streamlit run`, against whichever client the harness installed.
+import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+runpy.run_path(os.path.join(ROOT, "app.py"), run_name="__main__")
@@ -0,0 +1,374 @@
+# benchmarks/load_test.py
+# Drives the real page functions through Streamlit's AppTest with N concurrent
+# nurse/doctor sessions and reports rerun latency, Firestore operations per
+# session, PDF render time and peak RSS.
+#
+# Usage:
+#   python benchmarks/load_test.py --sessions 50
+#   python benchmarks/load_test.py --sessions 50 --save-baseline benchmarks/baseline.json
+#   python benchmarks/load_test.py --sessions 50 --baseline benchmarks/baseline.json
+#
+# AppTest installs a process-global runtime for each run, so two sessions
+# can't be in flight in one process. Sessions are spread over --workers
+# processes instead; sessions in the same worker run one after another and
+# share its caches, as sessions on one Streamlit server would. At most
+# --workers sessions are therefore ever concurrent, and the results report
+# the peak actually reached as concurrent_sessions.
+#
+# By default each worker gets its own SQLite database file (the on-prem
+# backend); with --backend emulator all workers share the Firestore emulator
+# at FIRESTORE_EMULATOR_HOST. Reads and writes are counted by the app's own
+# instrumentation (see instrumentation.py), so they are reported for both
+# backends unless INSTRUMENTATION=0.
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import data_access  # noqa: E402
+from criteria import response_keys  # noqa: E402
+from instrumentation import INSTRUMENTATION_ENABLED, instrument_client, metrics  # noqa: E402
+from reports import generate_pdf  # noqa: E402
+from response_codec import encode_document  # noqa: E402
+
+APP_ENTRY = os.path.join(BENCH_DIR, "app_entry.py")
+DOCTOR_ID = '1004'
+
+# Fixed so every worker seeds identical data
+SEED_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# Metrics where a higher value than the baseline counts as a regression
+REGRESSION_METRICS = [
+    'rerun_p50_ms', 'rerun_p95_ms', 'reads_per_session', 'writes_per_session',
+    'pdf_p50_ms', 'pdf_p95_ms', 'peak_rss_mb',
+]
+
+
+def seed_data(nurses, patients_per_nurse, questions):
+    base = SEED_EPOCH
+    patients = {}
+    for n in range(nurses):
+        for p in range(patients_per_nurse):
+            patient_id = f"P{n:03d}-{p:04d}"
+            responses = {key: 'no' for key in response_keys}
+            if p % 3 == 1:
+                responses['exclusion_35'] = 'yes'
+            elif p % 3 == 2:
+                responses['inclusion_4'] = 'not sure'
+            patients[patient_id] = encode_document({
+                'nurse_id': f"N{n:03d}",
+                'patient_id': patient_id,
+                'subject_name': f"Subject {n}-{p}",
+                'responses': responses,
+                'conclusion': ['Eligible', 'Excluded', 'Unconcluded'][p % 3],
+                'submitted_at': base + timedelta(minutes=n * patients_per_nurse + p),
+            })
+    qa = {}
+    for q in range(questions):
+        answered = q % 2 == 0
+        qa[f"q{q:04d}"] = {
+            'question': f"Benchmark question {q}?",
+            'answer': f"Benchmark answer {q}." if answered else None,
+            'answered': answered,
+            'created_at': base + timedelta(seconds=q),
+        }
+    return {
+        'NURSE': {'nurse_ids': {'nid': [f"N{n:03d}" for n in range(nurses)]}},
+        'PATIENTS': patients,
+        'QUESTIONS': qa,
+    }
+
+
+def emulator_client():
+    from google.cloud import firestore
+
+    return firestore.Client(project=os.getenv('GCLOUD_PROJECT', 'demo-nursebot'))
+
+
+def load_emulator(seed):
+    db = emulator_client()
+    batch = db.batch()
+    pending = 0
+    for collection, docs in seed.items():
+        for doc_id, data in docs.items():
+            batch.set(db.collection(collection).document(doc_id), data)
+            pending += 1
+            if pending == 500:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+    if pending:
+        batch.commit()
+
+
+def sqlite_client(seed):
+    from sqlite_store import SQLiteClient
+
+    db = SQLiteClient(os.path.join(tempfile.mkdtemp(), 'nursebot.db'))
+    db.load_documents(seed)
+    return db
+
+
+def install_backend(backend, seed):
+    # The app sees the instrumented client, as it would in production
+    db = sqlite_client(seed) if backend == 'sqlite' else emulator_client()
+    data_access._db = instrument_client(db)
+    return data_access._db
+
+
+def _find(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+class TimedSession:
+
+    def __init__(self, timeout):
+        self.app = AppTest.from_file(APP_ENTRY, default_timeout=timeout)
+        self.latencies = []
+        self.errors = []
+        self.unacknowledged = 0
+
+    def run(self):
+        started = time.perf_counter()
+        self.app.run()
+        self.latencies.append(time.perf_counter() - started)
+        if self.app.exception:
+            self.errors.extend(e.message for e in self.app.exception)
+
+    def login(self, user_id):
+        self.run()
+        self.app.text_input[0].set_value(user_id)
+        self.app.button[0].click()
+        self.run()
+
+
+def nurse_session(index, nurses, timeout):
+    session = TimedSession(timeout)
+    at = session.app
+    session.login(f"N{index % nurses:03d}")
+
+    # Clinical Test: one full assessment, submitted once
+    _find(at.text_input, "Enter the ID of the patient:").set_value(f"BENCH-{index:04d}")
+    session.run()
+    _find(at.text_input, "Enter the name of the subject:").set_value(f"Bench subject {index}")
+    for radio in at.main.radio:
+        radio.set_value("No")
+    _find(at.button, "Submit Patient Data").click()
+    session.run()
+    if not any(message.value.startswith("Patient data has been saved") for message in at.success):
+        session.unacknowledged += 1
+
+    # Download Reports: list the first page (PDFs render only on download,
+    # which AppTest can't trigger; see measure_pdf)
+    at.sidebar.radio[0].set_value("Download Reports")
+    session.run()
+
+    # FAQ and Raised Queries
+    at.sidebar.radio[0].set_value("FAQ and Raised Queries")
+    session.run()
+    return session
+
+
+def doctor_session(index, timeout):
+    session = TimedSession(timeout)
+    at = session.app
+    session.login(DOCTOR_ID)
+    answers = [b for b in at.button if b.label == "Submit Answer"]
+    if answers:
+        at.text_input[0].set_value(f"Answer from doctor session {index}")
+        answers[0].click()
+        session.run()
+    session.run()
+    return session
+
+
+def measure_pdf(samples):
+    patient = encode_document({
+        'nurse_id': 'N000',
+        'patient_id': 'PDF-BENCH',
+        'subject_name': 'PDF benchmark',
+        'conclusion': 'Excluded',
+        'responses': {key: 'yes' if key.startswith('exclusion') else 'no' for key in response_keys},
+    })
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        generate_pdf(patient, patient['nurse_id'], patient['patient_id'])
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_worker(session_indices, options):
+    # Runs in its own process: own AppTest runtime, own journal, own database
+    os.environ['SUBMISSION_JOURNAL'] = os.path.join(tempfile.mkdtemp(), 'submissions.db')
+    seed = seed_data(options['nurses'], options['patients_per_nurse'], options['questions'])
+    db = install_backend(options['backend'], seed)
+
+    from submission_queue import get_submission_queue
+
+    queue = get_submission_queue(db)
+    results = []
+    for index in session_indices:
+        reads, writes = metrics.totals()
+        started = time.time()
+        if index < options['doctor_sessions']:
+            session = doctor_session(index, options['timeout'])
+        else:
+            session = nurse_session(index, options['nurses'], options['timeout'])
+        finished = time.time()
+
+        # Let the write-behind queue drain so its writes are billed to this session
+        deadline = time.monotonic() + 30
+        while queue.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        total_reads, total_writes = metrics.totals()
+        results.append({
+            'latencies': session.latencies,
+            'reads': total_reads - reads if INSTRUMENTATION_ENABLED else None,
+            'writes': total_writes - writes if INSTRUMENTATION_ENABLED else None,
+            'errors': session.errors,
+            'unacknowledged': session.unacknowledged,
+            'span': (started, finished),
+        })
+
+    # ru_maxrss is reported in kilobytes on Linux
+    return results, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def peak_concurrency(spans):
+    # Most sessions in flight at the same moment, from (start, end) times
+    events = sorted([(start, 1) for start, _ in spans] + [(end, -1) for _, end in spans])
+    peak = current = 0
+    for _, step in events:
+        current += step
+        peak = max(peak, current)
+    return peak
+
+
+def run_benchmark(args):
+    if args.backend == 'emulator':
+        load_emulator(seed_data(args.nurses, args.patients_per_nurse, args.questions))
+
+    doctors = min(args.sessions, max(1, round(args.sessions * args.doctor_share))) if args.doctor_share else 0
+    workers = min(args.sessions, args.workers or os.cpu_count() or 1)
+    options = {
+        'nurses': args.nurses,
+        'patients_per_nurse': args.patients_per_nurse,
+        'questions': args.questions,
+        'backend': args.backend,
+        'doctor_sessions': doctors,
+        'timeout': args.timeout,
+    }
+    assignments = [list(range(args.sessions))[w::workers] for w in range(workers)]
+
+    started = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        outcomes = list(pool.map(run_worker, assignments, [options] * workers))
+    elapsed = time.perf_counter() - started
+
+    sessions = [result for results, _ in outcomes for result in results]
+    latencies = [latency for session in sessions for latency in session['latencies']]
+    errors = [error for session in sessions for error in session['errors']]
+    counted = all(session['reads'] is not None for session in sessions)
+    pdf_timings = measure_pdf(args.pdf_samples)
+
+    return {
+        'sessions': args.sessions,
+        'doctor_sessions': doctors,
+        'workers': workers,
+        'concurrent_sessions': peak_concurrency([session['span'] for session in sessions]),
+        'reruns': len(latencies),
+        'wall_time_s': round(elapsed, 3),
+        'rerun_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'rerun_p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'reads_per_session': round(sum(s['reads'] for s in sessions) / len(sessions), 2) if counted else None,
+        'writes_per_session': round(sum(s['writes'] for s in sessions) / len(sessions), 2) if counted else None,
+        'pdf_p50_ms': round(percentile(pdf_timings, 50) * 1000, 2),
+        'pdf_p95_ms': round(percentile(pdf_timings, 95) * 1000, 2),
+        'peak_rss_mb': round(max(rss for _, rss in outcomes), 1),
+        'unacknowledged_submissions': sum(s['unacknowledged'] for s in sessions),
+        'errors': len(errors),
+        'first_errors': errors[:5],
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for metric in REGRESSION_METRICS:
+        current, previous = results.get(metric), baseline.get(metric)
+        if current is None or previous is None:
+            continue
+        if current > previous * (1 + tolerance):
+            regressions.append((metric, previous, current))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent session benchmark for app.py")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--workers", type=int, help="worker processes, i.e. sessions in flight at once (default: CPU count)")
+    parser.add_argument("--doctor-share", type=float, default=0.1, help="fraction of sessions that are doctors")
+    parser.add_argument("--nurses", type=int, default=20)
+    parser.add_argument("--patients-per-nurse", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--pdf-samples", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per rerun")
+    parser.add_argument("--backend", choices=["sqlite", "emulator"], default="sqlite")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--save-baseline", help="store results as the new baseline")
+    parser.add_argument("--baseline", help="compare results against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    if args.backend == "emulator" and not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        parser.error("--backend emulator needs FIRESTORE_EMULATOR_HOST")
+
+    results = run_benchmark(args)
+    print(json.dumps(results, indent=2))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    status = 0
+    if results['errors']:
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for metric, previous, current in regressions:
+            print(f"REGRESSION {metric}: {previous} -> {current}")
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions beyond {args.tolerance:.0%} of baseline.")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
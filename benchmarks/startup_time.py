@@ -0,0 +1,84 @@
+# benchmarks/startup_time.py
+# Cold-start budget check: in a fresh interpreter, renders the login page the
+# way a woken-up instance would and fails if it takes longer than the budget
+# or pulls in modules that are meant to load only on the pages that need them.
+#
+# Usage:
+#   python benchmarks/startup_time.py
+#   python benchmarks/startup_time.py --budget-ms 1500 --repeat 5
+#
+# Streamlit's own import is timed separately and not counted against the
+# budget, since the server has already paid for it before the first session.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_ENTRY = os.path.join(BENCH_DIR, "app_entry.py")
+
+# Heavy modules the login page must not import
+DEFERRED_MODULES = ['pandas', 'reportlab', 'firebase_admin', 'google.cloud.firestore']
+
+# Runs in the child interpreter and prints one JSON line
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file({entry!r}, default_timeout=60).run()
+rendered = time.perf_counter()
+print(json.dumps({{
+    'streamlit_ms': (imported - started) * 1000,
+    'first_render_ms': (rendered - imported) * 1000,
+    'exceptions': [e.value for e in at.exception],
+    'loaded': [m for m in {deferred!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_once():
+    probe = PROBE.format(entry=APP_ENTRY, deferred=DEFERRED_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True, cwd=os.path.dirname(BENCH_DIR)
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login page cold-start budget check")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '1000')),
+                        help="allowed median first render, excluding the Streamlit import")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to measure")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    results = {
+        'streamlit_ms': statistics.median(r['streamlit_ms'] for r in runs),
+        'first_render_ms': statistics.median(r['first_render_ms'] for r in runs),
+        'budget_ms': args.budget_ms,
+        'loaded': sorted({m for r in runs for m in r['loaded']}),
+        'exceptions': [e for r in runs for e in r['exceptions']],
+    }
+    print(json.dumps(results, indent=2))
+
+    status = 0
+    if results['exceptions']:
+        print("FAIL login page raised an exception")
+        status = 1
+    if results['loaded']:
+        print(f"FAIL login page imported deferred modules: {', '.join(results['loaded'])}")
+        status = 1
+    if results['first_render_ms'] > args.budget_ms:
+        print(f"FAIL first render {results['first_render_ms']:.0f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        status = 1
+    if status == 0:
+        print("Startup within budget.")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bulk_export.py
+# Renders many patient reports in a process pool and streams them into a
+# single ZIP archive. Only a bounded window of PDFs is in flight at a time,
+# so memory stays flat no matter how many patients are exported. A report
+# that fails to render is skipped and reported rather than aborting the export.
+import multiprocessing
+import os
+import tempfile
+import time as clock
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, time
+
+from reports import generate_pdf
+
+# Reports can only be generated for these conclusions
+EXPORTABLE_CONCLUSIONS = ["Eligible", "Excluded"]
+
+# Built archives are kept here until downloaded, and removed once older than
+# EXPORT_MAX_AGE seconds so abandoned sessions don't leave patient reports behind
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'nursebot_exports'))
+EXPORT_MAX_AGE = float(os.getenv('EXPORT_MAX_AGE', '3600'))
+
+
+def new_export_file():
+    # Returns (binary file object, path) for a new archive
+    os.makedirs(EXPORT_DIR, mode=0o700, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="patient_reports_", suffix=".zip", dir=EXPORT_DIR)
+    return os.fdopen(fd, 'wb'), path
+
+
+def remove_stale_exports(max_age=EXPORT_MAX_AGE):
+    cutoff = clock.time() - max_age
+    try:
+        entries = list(os.scandir(EXPORT_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.startswith("patient_reports_") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def build_export_query(db, nurse_id=None, conclusions=None, start_date=None, end_date=None):
+    # Filters combined with a submitted_at range need the composite indexes
+    # in firestore.indexes.json
+    query = db.collection('PATIENTS')
+    if nurse_id:
+        query = query.where('nurse_id', '==', nurse_id)
+    query = query.where('conclusion', 'in', conclusions or EXPORTABLE_CONCLUSIONS)
+    if start_date is not None:
+        query = query.where('submitted_at', '>=', datetime.combine(start_date, time.min))
+    if end_date is not None:
+        query = query.where('submitted_at', '<=', datetime.combine(end_date, time.max))
+    return query
+
+
+def _render(patient_info):
+    patient_id = patient_info.get('patient_id', 'N/A')
+    nurse_id = patient_info.get('nurse_id', 'N/A')
+    return patient_id, generate_pdf(patient_info, nurse_id, patient_id)
+
+
+def export_reports_zip(patients, out_file, max_workers=None, on_progress=None):
+    # patients: iterable of patient dicts, consumed lazily (e.g. a query stream)
+    # out_file: path or binary file object the ZIP is written to
+    # Returns (number exported, [(patient_id, error message)] for failed renders)
+    max_workers = max_workers or os.cpu_count() or 1
+    window = max_workers * 4
+    exported = 0
+    failures = []
+
+    # Spawned workers only import reports.py, not the Firebase client
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool, \
+            zipfile.ZipFile(out_file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        pending = {}
+        patients = iter(patients)
+        exhausted = False
+
+        while pending or not exhausted:
+            # Keep the pool busy without queueing the whole collection
+            while not exhausted and len(pending) < window:
+                patient_info = next(patients, None)
+                if patient_info is None:
+                    exhausted = True
+                    break
+                if patient_info.get('conclusion') not in EXPORTABLE_CONCLUSIONS:
+                    continue
+                pending[pool.submit(_render, patient_info)] = patient_info.get('patient_id', 'N/A')
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                patient_id = pending.pop(future)
+                try:
+                    _, pdf_bytes = future.result()
+                except Exception as e:
+                    failures.append((patient_id, str(e)))
+                    continue
+                archive.writestr(f"patient_{patient_id}_report.pdf", pdf_bytes)
+                exported += 1
+                if on_progress is not None:
+                    on_progress(exported + len(failures))
+
+    return exported, failures
@@ -0,0 +1,52 @@
+# concurrent_reads.py
+# Issues independent Firestore reads from one rerun together instead of one
+# after another, so a page waits for its slowest read rather than the sum.
+# A process-wide semaphore bounds how many reads are in flight across all
+# sessions at once.
+#
+# Each call runs on its own short-lived thread, in a copy of the caller's
+# context (so instrumentation attributes its reads to the calling session
+# and page) and with the caller's Streamlit script context attached (so
+# st.cache_data behaves as it would on the script thread).
+import contextvars
+import os
+import threading
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+# Reads in flight at once, per process
+MAX_CONCURRENT_READS = int(os.getenv('MAX_CONCURRENT_READS', '8'))
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT_READS)
+
+
+def gather(*calls):
+    # Runs zero-argument callables concurrently and returns their results in
+    # order. The first exception raised by any call is re-raised here.
+    if len(calls) <= 1:
+        return [call() for call in calls]
+
+    results = [None] * len(calls)
+    errors = [None] * len(calls)
+
+    def run(i, call):
+        with _slots:
+            try:
+                results[i] = call()
+            except BaseException as e:
+                errors[i] = e
+
+    threads = []
+    for i, call in enumerate(calls):
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(run, i, call), name=f'firestore-read-{i}', daemon=True)
+        add_script_run_ctx(thread)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
@@ -0,0 +1,75 @@
+# criteria.py
+# Screening questions shared by the app, the report renderer and the batch
+# screening engine.
+
+inclusion_criteria = [
+    "Is the subject aged between 18 and 75 years at Screening?",
+    "Has informed consent been obtained?",
+    "Is the infection (HABP/VABP ± ccBSI) caused by a suspected or documented carbapenem-resistant Gram-negative pathogen?",
+    "Does the subject have CrCL (>30 mL/min)?",
+
+    # HABP/VABP Specific Inclusion Criteria
+    "Does the subject have hospital-acquired or ventilator-associated bacterial pneumonia with or without concurrent bloodstream infection?",
+    "Does the subject have a new onset or worsening of pulmonary symptoms, such as cough, dyspnea, tachypnea (e.g., respiratory rate > 25 breaths per minute), or expectorated sputum production?",
+    "Is there a need for mechanical ventilation or an increase in ventilator support to enhance oxygenation?",
+    "Has the subject's partial pressure of oxygen dropped below 60 mmHg while breathing room air, or has the PaO2/FiO2 ratio worsened?",
+    "Is there a new onset or increase in suctioned respiratory secretions?",
+    "Does the subject have documented fever (e.g., core body temperature ≥ 38°C) or hypothermia (e.g., core body temperature ≤ 35°C)?",
+    "Does the subject have leukocytosis with a WBC count ≥ 10,000 cells/mm³, leukopenia with a WBC count ≤ 4,500 cells/mm³, or more than 15% immature neutrophils (bands) on a peripheral blood smear?",
+
+    # cIAI Specific Inclusion Criteria
+    "Does the subject meet specific criteria for cIAI inclusion?",
+    "Does the subject have cholecystitis with gangrenous rupture or infection progression beyond the gallbladder wall?",
+    "Does the subject have diverticular disease with perforation or abscess?",
+    "Does the subject have appendiceal perforation or a peri-appendiceal abscess?",
+    "Does the subject have acute gastric or duodenal perforation (if operated on more than 24 hours after perforation)?",
+    "Does the subject have traumatic perforation of the intestines (if operated on more than 12 hours after perforation)?",
+    "Does the subject have secondary peritonitis (excluding spontaneous peritonitis associated with cirrhosis and chronic ascites)?",
+    "Does the subject have an intra-abdominal abscess with evidence of intraperitoneal involvement?",
+
+    # ccBSI Specific Inclusion Criteria
+    "Does the subject have one or more positive blood cultures identifying a carbapenem-resistant Gram-negative pathogen that is consistent with the subject's clinical condition?",
+    "Does the subject have signs or symptoms associated with bacteremia?",
+
+    # cUTI or AP Specific Inclusion Criteria
+    "Is there a confirmed cUTI or AP with or without concurrent bloodstream infection?",
+    "Has the subject had an indwelling urinary catheter or recent instrumentation of the urinary tract (within 14 days prior to Screening)?",
+    "Does the subject have urinary retention with 100 mL or more of residual urine after voiding (neurogenic bladder)?",
+    "Does the subject have obstructive uropathy (e.g., nephrolithiasis or fibrosis)?",
+    "Does the subject have azotemia caused by intrinsic renal disease (BUN and creatinine values greater than normal clinical laboratory values)?",
+    "Does the subject present with at least two signs or symptoms: chills, rigors, or warmth associated with fever (temperature ≥ 38°C); flank pain or suprapubic/pelvic pain; nausea or vomiting; dysuria, urinary frequency, or urgency; or costovertebral angle tenderness on physical examination?",
+    "Does the subject's urinalysis show evidence of pyuria, demonstrated by either a positive dipstick analysis for leukocyte esterase or ≥ 10 WBCs/µL in unspun urine, or ≥ 10 WBCs/high-power field in spun urine?",
+    "Did the subject have a positive urine culture within 48 hours before WCK 5222 treatment initiation, showing ≥ 10⁵ CFU/mL of a carbapenem-resistant Gram-negative uropathogen?",
+    "Is the subject receiving antibiotic prophylaxis for cUTI but presenting with signs and symptoms consistent with an active new cUTI?"
+]
+
+exclusion_criteria = [
+    "Does the subject have any hypersensitivity or allergic reactions to B-lactam antibiotics?",
+    "Does the subject have any pre-existing neurological disorders?",
+    "Has the subject received any prior treatment with antibiotics effective against carbapenem-resistant Gram-negative bacteria?",
+    "Does the subject have severe sepsis or septic shock requiring high-level vasopressors?",
+    "Does the subject have a Cr <30 mL/min at screening?",
+    "Is there a history of chronic kidney disease?",
+    "Are there any co-infections with specific pathogens (e.g., Gram-positive bacteria, Aspergillosis)?",
+    "Is there a central nervous system infection present?",
+    "Does the subject have infections requiring extended antibiotic treatment (e.g., bone infections)?",
+    "Does the subject have cystic fibrosis or severe bronchiectasis?",
+    "Does the subject have severe neutropenia?",
+    "Has the subject tested positive for pregnancy or is lactating?",
+    "Does the subject have a Sequential Organ Failure Assessment (SOFA) score greater than 6?",
+    "Is there any condition that might compromise safety or data quality according to the investigator?",
+    "Has the subject received any investigational drug or device within 30 days prior to entry?",
+    "Has the subject been previously enrolled in this study or received WCK 5222?",
+    "Is the subject receiving dialysis, continuous renal replacement therapy, or ECMO?",
+    "Does the subject have myasthenia gravis or any other neuromuscular disorder?",
+    "Does the subject have severe liver disease?"
+]
+
+# Keys under which each answer is stored in a patient's 'responses' map.
+# Numbering runs across both lists: inclusion_1..inclusion_30, exclusion_31..exclusion_49.
+inclusion_keys = [f'inclusion_{idx}' for idx in range(1, len(inclusion_criteria) + 1)]
+exclusion_keys = [
+    f'exclusion_{idx}'
+    for idx in range(len(inclusion_criteria) + 1, len(inclusion_criteria) + len(exclusion_criteria) + 1)
+]
+response_keys = inclusion_keys + exclusion_keys
@@ -0,0 +1,141 @@
+# data_access.py
+# Shared Firestore access for every page. One client per process, plus
+# cross-session TTL caches for the small reference documents that every
+# session reads (nurse allowlist, pages of doctor Q&A).
+import os
+import threading
+
+import streamlit as st
+from dotenv import load_dotenv
+
+import patient_index
+import qa_live
+import question_dedup
+from instrumentation import instrument_client
+import qa_store
+import screening_stats
+
+load_dotenv()
+
+# Where documents are stored: 'firestore', or 'sqlite' for a local database file
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'firestore')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'nursebot.db')
+
+# Service account key for the one Firebase app this process initializes
+FIREBASE_CREDENTIALS = os.getenv('VARIABLE')
+
+# How long reference documents are served from cache before re-reading
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', '300'))
+
+# Questions shown per page on the FAQ and doctor dashboard
+QA_PAGE_SIZE = int(os.getenv('QA_PAGE_SIZE', '20'))
+
+# How long enrollment statistics are served from cache
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', '30'))
+
+# How long a page waits for the Q&A listener's first sync before querying instead
+LIVE_SYNC_TIMEOUT = float(os.getenv('LIVE_SYNC_TIMEOUT', '2'))
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def _open_backend():
+    if STORAGE_BACKEND == 'sqlite':
+        import sqlite_store
+
+        return sqlite_store.SQLiteClient(SQLITE_PATH)
+    if STORAGE_BACKEND != 'firestore':
+        raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}; expected 'firestore' or 'sqlite'")
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(FIREBASE_CREDENTIALS)
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+def get_db():
+    # The storage SDK is imported here rather than at module level so the
+    # login page renders without paying for it
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = instrument_client(_open_backend())
+        return _db
+
+
+@st.cache_data(ttl=REFERENCE_CACHE_TTL, show_spinner=False)
+def get_nurse_ids():
+    # None when the allowlist document is missing, so callers can tell it apart from empty
+    doc = get_db().collection('NURSE').document('nurse_ids').get()
+    if not doc.exists:
+        return None
+    return list(doc.to_dict().get('nid', []))
+
+
+@st.cache_data(ttl=REFERENCE_CACHE_TTL, show_spinner=False)
+def _query_questions_page(answered, page_size, cursor=None):
+    return qa_store.list_questions(get_db(), answered, page_size, cursor)
+
+
+def get_questions_page(answered, page_size, cursor=None):
+    # Served from the live listener's in-memory view once it has synced;
+    # until then (or if it can't start) fall back to cached queries.
+    view = get_qa_view()
+    if view is not None and view.ready:
+        return view.page(answered, page_size, cursor)
+    return _query_questions_page(answered, page_size, cursor)
+
+
+def get_qa_view():
+    try:
+        view = qa_live.get_live_view(get_db())
+    except Exception:
+        return None
+    view.wait_ready(LIVE_SYNC_TIMEOUT)
+    return view
+
+
+def get_patient_index(nurse_id):
+    # None when the listener can't start; callers fall back to paged queries
+    try:
+        index = patient_index.get_patient_index(get_db(), nurse_id)
+    except Exception:
+        return None
+    index.wait_ready(LIVE_SYNC_TIMEOUT)
+    return index
+
+
+def invalidate_questions():
+    # The live view picks up writes by itself; only the fallback cache needs clearing
+    _query_questions_page.clear()
+
+
+def save_answer(qid, answer):
+    qa_store.save_answer(get_db(), qid, answer)
+    invalidate_questions()
+
+
+def find_duplicates(question):
+    # Existing questions that look like rewordings of this one, best first.
+    # Only shown as possibly related, never as an answer. Needs the live
+    # view; without it nothing is reported.
+    index = question_dedup.get_dedup_index()
+    index.sync(get_qa_view())
+    return [payload for _, payload in index.similar(question)]
+
+
+def raise_question(question):
+    # Always a new entry; near-duplicates are merged later, after review
+    # (python question_dedup.py dedup)
+    qid = qa_store.raise_question(get_db(), question)
+    invalidate_questions()
+    return qid
+
+
+@st.cache_data(ttl=STATS_CACHE_TTL, show_spinner=False)
+def get_screening_stats():
+    return screening_stats.load_stats(get_db())
@@ -1,47 +1,49 @@
 # doctor_dashboard.py
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-# Initialize Firebase (Only once)
-if not firebase_admin._apps:
-    cred = credentials.Certificate("nursebot.json")
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+from data_access import QA_PAGE_SIZE, get_qa_view, get_questions_page, save_answer
+from qa_live import watch_pages
+from instrumentation import track_page
+from pagination import cursor_pager, page_cursor
+from concurrent_reads import gather
 
+@track_page("Doctor Dashboard")
 def doctor_dashboard():
     st.title("🏥 Doctor Dashboard")
 
-    # Reference to the doctor document
-    doctor_doc_ref = db.collection("DOCTOR").document("1")  # Adjust the document path as needed
-
-    # Fetch data from Firestore
-    doc = doctor_doc_ref.get()
-    data = doc.to_dict() if doc.exists else {}
-
-    qn_list = data.get("qn", [])
-    ans_dict = data.get("ans", {})
+    # Rerun when the shared listener sees new questions or answers on the shown pages
+    unanswered_cursor, answered_cursor = page_cursor("doctor_unanswered_pages"), page_cursor("doctor_answered_pages")
+    view = get_qa_view()
+    if view is not None:
+        watch_pages(view, QA_PAGE_SIZE, [(False, unanswered_cursor), (True, answered_cursor)])
 
-    # ✅ Fix: Ensure ans_dict is always a dictionary
-    if not isinstance(ans_dict, dict):
-        ans_dict = {}
-
-    # Separate Answered & Unanswered Questions
-    answered_qs = {q: ans_dict[q] for q in qn_list if q in ans_dict}
-    unanswered_qs = [q for q in qn_list if q not in ans_dict]
+    fetch_unanswered = lambda: get_questions_page(False, QA_PAGE_SIZE, unanswered_cursor)
+    fetch_answered = lambda: get_questions_page(True, QA_PAGE_SIZE, answered_cursor)
+    if view is not None and view.ready:
+        # Served from memory; extra threads would only add overhead
+        unanswered_page, answered_page = fetch_unanswered(), fetch_answered()
+    else:
+        # Both lists are independent, so query their current pages together
+        unanswered_page, answered_page = gather(fetch_unanswered, fetch_answered)
 
-    # Display Unanswered Questions with Input Box
+    # Display Unanswered Questions with Input Box, one page at a time
+    st.subheader("📌 Unanswered Questions")
+    unanswered_qs = cursor_pager(
+        "doctor_unanswered_pages",
+        lambda cursor: unanswered_page,
+        lambda question: question['created_at'],
+    )
     if unanswered_qs:
-        st.subheader("📌 Unanswered Questions")
-        for q in unanswered_qs:
+        for item in unanswered_qs:
+            q = item['question']
             st.write(f"**Q:** {q}")
-            answer = st.text_input(f"Enter answer:", key=q)
-            if st.button(f"Submit Answer", key=f"btn_{q}"):
+            # Rewordings merged into this question by the duplicate check
+            if item.get('variants'):
+                st.caption(f"Raised {item.get('raised_count', 1)} times, also as: " + "; ".join(item['variants']))
+            answer = st.text_input(f"Enter answer:", key=item['id'])
+            if st.button(f"Submit Answer", key=f"btn_{item['id']}"):
                 if answer.strip():
-                    doctor_doc_ref.set({
-                        "ans": {**ans_dict, q: answer}  # ✅ Now always a dictionary
-                    }, merge=True)
+                    # Writes only this question's document and invalidates the cached pages
+                    save_answer(item['id'], answer)
                     st.success("Answer saved successfully!")
                     st.rerun()
                 else:
@@ -50,13 +52,17 @@ def doctor_dashboard():
         st.write("✅ No pending questions.")
 
     # Display Answered Questions without Input Fields
-    if answered_qs:
-        st.subheader("✅ Answered Questions")
-        for q, a in answered_qs.items():
-            st.write(f"**Q:** {q}")
-            st.write(f"**A:** {a}")
+    st.subheader("✅ Answered Questions")
+    answered_qs = cursor_pager(
+        "doctor_answered_pages",
+        lambda cursor: answered_page,
+        lambda question: question['created_at'],
+    )
+    for item in answered_qs:
+        st.write(f"**Q:** {item['question']}")
+        st.write(f"**A:** {item['answer']}")
 
 
 # Call the doctor dashboard function if this file is run directly
 if __name__ == "__main__":
-    doctor_dashboard()
\ No newline at end of file
+    doctor_dashboard()
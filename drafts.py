@@ -0,0 +1,84 @@
+# drafts.py
+# Per nurse/patient assessment drafts. Saves are debounced and only the
+# answers that changed since the last write are sent, as merged field updates.
+import time
+
+DRAFTS_COLLECTION = 'DRAFTS'
+
+
+def draft_ref(db, nurse_id, patient_id):
+    return db.collection(DRAFTS_COLLECTION).document(f"{nurse_id}_{patient_id}")
+
+
+def load_draft(db, nurse_id, patient_id):
+    doc = draft_ref(db, nurse_id, patient_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def delete_draft(db, nurse_id, patient_id):
+    draft_ref(db, nurse_id, patient_id).delete()
+
+
+class DraftAutosaver:
+    # state is a per-session mapping (st.session_state) that remembers the
+    # last answers written and any delta still waiting for the debounce window.
+
+    def __init__(self, db, state, interval):
+        self.db = db
+        self.state = state
+        self.interval = interval
+
+    def _slot(self, nurse_id, patient_id):
+        key = f"draft_{nurse_id}_{patient_id}"
+        if key not in self.state:
+            self.state[key] = {'saved': {}, 'pending': {}, 'subject_name': None, 'last_write': 0.0}
+        return self.state[key]
+
+    def mark_saved(self, nurse_id, patient_id, subject_name, responses):
+        # Answers restored from a draft, or just submitted, don't need writing
+        slot = self._slot(nurse_id, patient_id)
+        slot['saved'] = dict(responses)
+        slot['subject_name'] = subject_name
+        slot['pending'] = {}
+        slot.pop('pending_subject', None)
+
+    def save(self, nurse_id, patient_id, subject_name, responses, force=False):
+        # Queues what changed since the last write; returns True when a write happened
+        slot = self._slot(nurse_id, patient_id)
+        for key, value in responses.items():
+            if slot['saved'].get(key) != value:
+                slot['pending'][key] = value
+            else:
+                slot['pending'].pop(key, None)
+        if subject_name != slot['subject_name']:
+            slot['pending_subject'] = subject_name
+        else:
+            slot.pop('pending_subject', None)
+        return self.flush(nurse_id, patient_id, force)
+
+    def flush(self, nurse_id, patient_id, force=False):
+        # Writes the queued delta unless the last write was under interval
+        # seconds ago; returns True when a write happened
+        slot = self._slot(nurse_id, patient_id)
+        if not slot['pending'] and 'pending_subject' not in slot:
+            return False
+        if not force and time.monotonic() - slot['last_write'] < self.interval:
+            return False
+
+        from firebase_admin import firestore
+
+        fields = {'nurse_id': nurse_id, 'patient_id': patient_id, 'updated_at': firestore.SERVER_TIMESTAMP}
+        if slot['pending']:
+            fields['responses'] = dict(slot['pending'])
+        if 'pending_subject' in slot:
+            fields['subject_name'] = slot['pending_subject']
+        draft_ref(self.db, nurse_id, patient_id).set(fields, merge=True)
+
+        slot['saved'].update(slot['pending'])
+        slot['pending'] = {}
+        slot['subject_name'] = slot.pop('pending_subject', slot['subject_name'])
+        slot['last_write'] = time.monotonic()
+        return True
+
+    def last_write(self, nurse_id, patient_id):
+        return self._slot(nurse_id, patient_id)['last_write']
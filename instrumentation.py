@@ -0,0 +1,591 @@
+# instrumentation.py
+# Hot-path instrumentation: latency histograms for Firestore calls, PDF
+# rendering, page functions and whole reruns, plus read/write/byte counters
+# per session and per page. Exposed as an admin sidebar panel and as
+# Prometheus text (download or periodic file dump).
+#
+# Attribution uses context variables set at the start of each rerun (and of
+# each fragment rerun, see track_fragment), so work done on background
+# threads (e.g. the submission flush worker) is recorded under the
+# "background" session and page.
+import contextvars
+import functools
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION', '1') != '0'
+
+# Reruns slower than this are logged and kept in the slow-rerun list
+SLOW_RERUN_MS = float(os.getenv('SLOW_RERUN_MS', '500'))
+SLOW_RERUN_KEEP = 20
+
+# Only this many sessions keep their own counters; older ones are dropped
+MAX_TRACKED_SESSIONS = 200
+
+# Prometheus text is written here after a rerun, at most every interval seconds
+METRICS_DUMP_PATH = os.getenv('METRICS_DUMP_PATH')
+METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', '30'))
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+BACKGROUND = "background"
+
+# Page name for reruns that don't enter a tracked page (e.g. the login screen)
+APP_PAGE = "app"
+
+_session = contextvars.ContextVar('instrumentation_session', default=BACKGROUND)
+_page = contextvars.ContextVar('instrumentation_page', default=BACKGROUND)
+_rerun = contextvars.ContextVar('instrumentation_rerun', default=None)
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, ms):
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += ms
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float('inf')
+        return float('inf')
+
+
+def _new_counters():
+    return {'reads': 0, 'writes': 0, 'bytes_read': 0, 'bytes_written': 0, 'calls': 0}
+
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.page_counters = {}
+        self.session_counters = OrderedDict()
+        self.slow_reruns = []
+        self._last_dump = 0.0
+
+    def observe(self, op, page, ms):
+        with self._lock:
+            key = (op, page)
+            if key not in self.latency:
+                self.latency[key] = Histogram()
+            self.latency[key].observe(ms)
+
+    def count(self, session, page, reads=0, writes=0, bytes_read=0, bytes_written=0):
+        with self._lock:
+            per_session = self.session_counters.get(session)
+            if per_session is None:
+                per_session = self.session_counters[session] = _new_counters()
+                while len(self.session_counters) > MAX_TRACKED_SESSIONS:
+                    self.session_counters.popitem(last=False)
+            else:
+                self.session_counters.move_to_end(session)
+            per_page = self.page_counters.setdefault(page, _new_counters())
+            for counters in (per_session, per_page):
+                counters['reads'] += reads
+                counters['writes'] += writes
+                counters['bytes_read'] += bytes_read
+                counters['bytes_written'] += bytes_written
+                counters['calls'] += 1
+
+    def record_rerun(self, entry):
+        with self._lock:
+            item = (entry['ms'], entry['at'], entry)
+            if len(self.slow_reruns) < SLOW_RERUN_KEEP:
+                heapq.heappush(self.slow_reruns, item)
+            else:
+                heapq.heappushpop(self.slow_reruns, item)
+
+    def top_slow_reruns(self):
+        with self._lock:
+            return [entry for _, _, entry in sorted(self.slow_reruns, key=lambda item: item[:2], reverse=True)]
+
+    def snapshot(self):
+        with self._lock:
+            return (
+                {key: (list(h.counts), h.total, h.count) for key, h in self.latency.items()},
+                {page: dict(c) for page, c in self.page_counters.items()},
+                {session: dict(c) for session, c in self.session_counters.items()},
+            )
+
+    def totals(self):
+        # (reads, writes) across every page, listeners and background work
+        with self._lock:
+            counters = self.page_counters.values()
+            return sum(c['reads'] for c in counters), sum(c['writes'] for c in counters)
+
+    def page_summary(self):
+        # One row per page: rerun latency percentiles plus Firestore totals
+        with self._lock:
+            rows = []
+            pages = {page for _, page in self.latency} | set(self.page_counters)
+            for page in sorted(pages):
+                hist = self.latency.get(('page', page))
+                counters = self.page_counters.get(page, _new_counters())
+                rows.append({
+                    'page': page,
+                    'runs': hist.count if hist else 0,
+                    'p50_ms': hist.quantile(0.5) if hist else 0.0,
+                    'p95_ms': hist.quantile(0.95) if hist else 0.0,
+                    'reads': counters['reads'],
+                    'writes': counters['writes'],
+                    'bytes_read': counters['bytes_read'],
+                    'bytes_written': counters['bytes_written'],
+                })
+            return rows
+
+    def maybe_dump(self):
+        if not METRICS_DUMP_PATH:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_dump < METRICS_DUMP_INTERVAL:
+                return
+            self._last_dump = now
+        write_prometheus(METRICS_DUMP_PATH)
+
+
+metrics = Metrics()
+
+
+def _record(op, started, reads=0, writes=0, bytes_read=0, bytes_written=0):
+    ms = (time.perf_counter() - started) * 1000
+    page = _page.get()
+    metrics.observe(op, page, ms)
+    if reads or writes or bytes_read or bytes_written or op.startswith('firestore.'):
+        metrics.count(_session.get(), page, reads, writes, bytes_read, bytes_written)
+
+    rerun = _rerun.get()
+    if rerun is not None:
+        bucket = op.split('.', 1)[0]
+        rerun['breakdown'][bucket] = rerun['breakdown'].get(bucket, 0.0) + ms
+        rerun['reads'] += reads
+        rerun['writes'] += writes
+
+
+def timed(op):
+    # Decorator recording the wrapped call's latency under op
+    def decorator(func):
+        if not INSTRUMENTATION_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(op, started)
+        return wrapper
+    return decorator
+
+
+def track_page(name):
+    # Decorator for page functions: attributes everything inside to the page
+    def decorator(func):
+        if not INSTRUMENTATION_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _page.set(name)
+            rerun = _rerun.get()
+            if rerun is not None:
+                rerun['page'] = name
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record('page', started)
+                _page.reset(token)
+        return wrapper
+    return decorator
+
+
+class track_rerun:
+    # Context manager around one whole script run, or one fragment run
+
+    def __init__(self, session_id, page=APP_PAGE):
+        self.session_id = session_id or BACKGROUND
+        self.page = page
+
+    def __enter__(self):
+        if not INSTRUMENTATION_ENABLED:
+            return self
+        self._tokens = (
+            _session.set(self.session_id),
+            _page.set(self.page),
+            _rerun.set({'page': self.page, 'breakdown': {}, 'reads': 0, 'writes': 0}),
+        )
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not INSTRUMENTATION_ENABLED:
+            return False
+        ms = (time.perf_counter() - self._started) * 1000
+        rerun = _rerun.get()
+        page = rerun['page']
+        metrics.observe('rerun', page, ms)
+        if ms >= SLOW_RERUN_MS:
+            entry = {
+                'ms': round(ms, 1),
+                'at': time.time(),
+                'session': self.session_id,
+                'page': page,
+                'reads': rerun['reads'],
+                'writes': rerun['writes'],
+                'breakdown': {k: round(v, 1) for k, v in rerun['breakdown'].items()},
+            }
+            metrics.record_rerun(entry)
+            logger.warning("Slow rerun: %.0f ms on %s (%s)", ms, page, entry['breakdown'])
+        _rerun.reset(self._tokens[2])
+        _page.reset(self._tokens[1])
+        _session.reset(self._tokens[0])
+        metrics.maybe_dump()
+        # StopException/RerunException from st.stop()/st.rerun() must propagate
+        return False
+
+
+def track_fragment(name):
+    # Decorator for st.fragment bodies (apply it under @st.fragment). When the
+    # fragment reruns on its own, the app's track_rerun isn't on the stack, so
+    # the run is tracked here under its session and the given page name.
+    def decorator(func):
+        if not INSTRUMENTATION_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _rerun.get() is not None:
+                # Called during a full rerun, which already tracks it
+                return func(*args, **kwargs)
+
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+            ctx = get_script_run_ctx()
+            with track_rerun(ctx.session_id if ctx else None, page=name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _size(data):
+    # Estimated document size, counted roughly the way Firestore does (string
+    # length + 1, 8 bytes per number or timestamp, 1 per bool/null, map keys
+    # as strings) without serialising the document
+    if isinstance(data, str):
+        return len(data) + 1
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, dict):
+        return sum(len(key) + 1 + _size(value) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return sum(_size(value) for value in data)
+    if data is None or isinstance(data, bool):
+        return 1
+    return 8
+
+
+# Firestore wrappers. Each proxies the real object and records every call that
+# goes over the network; anything not wrapped is passed straight through.
+
+def _unwrap(obj):
+    return getattr(obj, '_target', obj)
+
+
+class _Proxy:
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class InstrumentedQuery(_Proxy):
+
+    def _chain(self, method, *args, **kwargs):
+        args = [_unwrap(arg) for arg in args]
+        return InstrumentedQuery(getattr(self._target, method)(*args, **kwargs))
+
+    def where(self, *args, **kwargs):
+        started = time.perf_counter()
+        query = self._chain('where', *args, **kwargs)
+        _record('firestore.where', started)
+        return query
+
+    def order_by(self, *args, **kwargs):
+        return self._chain('order_by', *args, **kwargs)
+
+    def limit(self, *args, **kwargs):
+        return self._chain('limit', *args, **kwargs)
+
+    def start_after(self, *args, **kwargs):
+        return self._chain('start_after', *args, **kwargs)
+
+    def start_at(self, *args, **kwargs):
+        return self._chain('start_at', *args, **kwargs)
+
+    def end_at(self, *args, **kwargs):
+        return self._chain('end_at', *args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        # Time only what's spent fetching, not the caller's work between documents
+        iterator = iter(self._target.stream(*args, **kwargs))
+        elapsed = 0.0
+        docs = 0
+        size = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    doc = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - started
+                docs += 1
+                size += _size(doc.to_dict())
+                yield doc
+        finally:
+            # An empty result is still billed one read; passing "now - elapsed"
+            # as the start time records just the fetch time
+            _record('firestore.stream', time.perf_counter() - elapsed, reads=max(docs, 1), bytes_read=size)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+    def count(self, *args, **kwargs):
+        return InstrumentedAggregation(self._target.count(*args, **kwargs))
+
+    def on_snapshot(self, callback):
+        def counted(snapshots, changes, read_time):
+            size = sum(_size(change.document.to_dict()) for change in changes if change.document.exists)
+            metrics.count(BACKGROUND, 'listener', reads=len(changes), bytes_read=size)
+            return callback(snapshots, changes, read_time)
+        return self._target.on_snapshot(counted)
+
+
+class InstrumentedAggregation(_Proxy):
+
+    def get(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.get(*args, **kwargs)
+        _record('firestore.count', started, reads=1)
+        return result
+
+
+class InstrumentedCollection(InstrumentedQuery):
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._target.document(*args, **kwargs))
+
+
+class InstrumentedDocument(_Proxy):
+
+    def get(self, *args, **kwargs):
+        started = time.perf_counter()
+        snapshot = self._target.get(*args, **kwargs)
+        size = _size(snapshot.to_dict()) if snapshot.exists else 0
+        _record('firestore.get', started, reads=1, bytes_read=size)
+        return snapshot
+
+    def set(self, data, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.set(data, *args, **kwargs)
+        _record('firestore.set', started, writes=1, bytes_written=_size(data))
+        return result
+
+    def update(self, fields, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.update(fields, *args, **kwargs)
+        _record('firestore.update', started, writes=1, bytes_written=_size(fields))
+        return result
+
+    def delete(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.delete(*args, **kwargs)
+        _record('firestore.delete', started, writes=1)
+        return result
+
+    def collection(self, *args, **kwargs):
+        return InstrumentedCollection(self._target.collection(*args, **kwargs))
+
+
+class InstrumentedBatch(_Proxy):
+
+    def __init__(self, target):
+        super().__init__(target)
+        self._writes = 0
+        self._bytes = 0
+
+    def set(self, ref, data, *args, **kwargs):
+        self._writes += 1
+        self._bytes += _size(data)
+        return self._target.set(_unwrap(ref), data, *args, **kwargs)
+
+    def update(self, ref, fields, *args, **kwargs):
+        self._writes += 1
+        self._bytes += _size(fields)
+        return self._target.update(_unwrap(ref), fields, *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        self._writes += 1
+        return self._target.delete(_unwrap(ref), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.commit(*args, **kwargs)
+        _record('firestore.commit', started, writes=self._writes, bytes_written=self._bytes)
+        self._writes = self._bytes = 0
+        return result
+
+
+class InstrumentedTransaction(InstrumentedBatch):
+    # Writes are staged like a batch; firestore.transactional drives the
+    # private begin/commit/rollback hooks, which are proxied through
+
+    def _commit(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target._commit(*args, **kwargs)
+        _record('firestore.commit', started, writes=self._writes, bytes_written=self._bytes)
+        self._writes = self._bytes = 0
+        return result
+
+    def _clean_up(self, *args, **kwargs):
+        # A retried attempt stages its writes again
+        self._writes = self._bytes = 0
+        return self._target._clean_up(*args, **kwargs)
+
+
+class InstrumentedClient(_Proxy):
+
+    def collection(self, *args, **kwargs):
+        return InstrumentedCollection(self._target.collection(*args, **kwargs))
+
+    def batch(self, *args, **kwargs):
+        return InstrumentedBatch(self._target.batch(*args, **kwargs))
+
+    def transaction(self, *args, **kwargs):
+        return InstrumentedTransaction(self._target.transaction(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        if 'transaction' in kwargs:
+            kwargs['transaction'] = _unwrap(kwargs['transaction'])
+        started = time.perf_counter()
+        snapshots = list(self._target.get_all([_unwrap(ref) for ref in references], *args, **kwargs))
+        size = sum(_size(snapshot.to_dict()) for snapshot in snapshots if snapshot.exists)
+        _record('firestore.get_all', started, reads=max(len(snapshots), 1), bytes_read=size)
+        return snapshots
+
+
+def instrument_client(db):
+    if not INSTRUMENTATION_ENABLED or isinstance(db, InstrumentedClient):
+        return db
+    return InstrumentedClient(db)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus():
+    latency, pages, sessions = metrics.snapshot()
+    lines = [
+        "# HELP nursebot_latency_ms Latency of instrumented operations in milliseconds.",
+        "# TYPE nursebot_latency_ms histogram",
+    ]
+    for (op, page), (counts, total, count) in sorted(latency.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS_MS + ('+Inf',), counts):
+            cumulative += n
+            lines.append(f"nursebot_latency_ms_bucket{_labels(op=op, page=page, le=bound)} {cumulative}")
+        lines.append(f"nursebot_latency_ms_sum{_labels(op=op, page=page)} {total:.3f}")
+        lines.append(f"nursebot_latency_ms_count{_labels(op=op, page=page)} {count}")
+
+    for name, help_text in (
+        ('reads', 'Firestore documents read.'),
+        ('writes', 'Firestore documents written.'),
+        ('bytes_read', 'Approximate bytes of Firestore documents read.'),
+        ('bytes_written', 'Approximate bytes of Firestore documents written.'),
+    ):
+        metric = f"nursebot_firestore_{name}_total"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for page, counters in sorted(pages.items()):
+            lines.append(f"{metric}{_labels(scope='page', page=page)} {counters[name]}")
+        for session, counters in sessions.items():
+            lines.append(f"{metric}{_labels(scope='session', session=session)} {counters[name]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    # Written to a temporary file first so scrapers never see a partial dump
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def admin_panel(report_cache=None):
+    import streamlit as st
+
+    with st.sidebar.expander("📈 Performance"):
+        rows = metrics.page_summary()
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("No measurements yet.")
+
+        slow = metrics.top_slow_reruns()
+        st.caption(f"Slowest reruns (over {SLOW_RERUN_MS:.0f} ms)")
+        for entry in slow:
+            st.text(f"{entry['ms']:.0f} ms  {entry['page']}  r={entry['reads']} w={entry['writes']}  {entry['breakdown']}")
+        if not slow:
+            st.caption("None recorded.")
+
+        if report_cache is not None:
+            stats = report_cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "n/a"
+            st.caption(
+                f"PDF cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate} hit rate); "
+                f"{stats['entries']} reports, {stats['bytes'] / 1e6:.1f} of {stats['max_bytes'] / 1e6:.0f} MB"
+            )
+
+        st.download_button(
+            "Download Prometheus metrics",
+            data=render_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain",
+            key="download_metrics",
+        )
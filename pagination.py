@@ -0,0 +1,40 @@
+# pagination.py
+# Cursor-based Previous/Next paging shared by the list pages.
+import streamlit as st
+
+
+def _cursors(state_key, scope):
+    # The stack of cursors lives in session state under state_key and is
+    # reset whenever scope changes (e.g. a different nurse logs in).
+    state = st.session_state.get(state_key)
+    if state is None or state['scope'] != scope:
+        state = st.session_state[state_key] = {'scope': scope, 'cursors': [None]}
+    return state['cursors']
+
+
+def page_cursor(state_key, scope=None):
+    # Cursor of the page cursor_pager will show, so several pagers' pages can
+    # be fetched together beforehand
+    return _cursors(state_key, scope)[-1]
+
+
+def cursor_pager(state_key, fetch_page, cursor_of, scope=None):
+    # fetch_page(cursor) -> (items, has_next); cursor_of(last_item) -> cursor.
+    cursors = _cursors(state_key, scope)
+
+    items, has_next = fetch_page(cursors[-1])
+
+    if len(cursors) > 1 or has_next:
+        prev_col, page_col, next_col = st.columns([0.2, 0.6, 0.2])
+        with prev_col:
+            if st.button("Previous", key=f"{state_key}_prev", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+        with page_col:
+            st.write(f"Page {len(cursors)}")
+        with next_col:
+            if st.button("Next", key=f"{state_key}_next", disabled=not has_next):
+                cursors.append(cursor_of(items[-1]))
+                st.rerun()
+
+    return items
@@ -0,0 +1,13 @@
+# patient_ids.py
+# Patient IDs become Firestore document IDs, so they're checked wherever they
+# enter the system (the Clinical Test form, partner-site log ingest).
+
+
+def patient_id_error(patient_id):
+    # A message saying why patient_id can't be used, or None if it's fine.
+    # Document IDs can't contain '/' or be '.', '..' or of the form __name__.
+    if not patient_id:
+        return "Please enter the ID of the patient."
+    if '/' in patient_id or patient_id in ('.', '..') or (patient_id.startswith('__') and patient_id.endswith('__')):
+        return "Patient IDs can't contain '/' or be '.', '..' or start and end with '__'."
+    return None
@@ -0,0 +1,137 @@
+# patient_index.py
+# Per-nurse, push-updated index of PATIENTS for the Reports page. A snapshot
+# listener scoped to the nurse keeps the documents in memory along with a
+# sorted list of search terms, so prefix lookups on patient ID or subject
+# name are a bisect away and new submissions appear without re-querying.
+import bisect
+import os
+import threading
+from collections import OrderedDict
+
+# Nurses whose indexes (and listeners) are kept alive at once; the least
+# recently used one is stopped when another nurse opens the Reports page
+PATIENT_INDEX_MAX_NURSES = int(os.getenv('PATIENT_INDEX_MAX_NURSES', '50'))
+
+
+def normalize(text):
+    return ' '.join(str(text or '').casefold().split())
+
+
+def search_terms(patient):
+    # The patient ID, the full subject name and each later word of the name,
+    # so "doe" finds "Jane Doe"
+    terms = {normalize(patient.get('patient_id'))}
+    name = normalize(patient.get('subject_name'))
+    words = name.split(' ')
+    terms.update(' '.join(words[i:]) for i in range(len(words)))
+    terms.discard('')
+    return terms
+
+
+class PatientIndex:
+
+    def __init__(self, db, nurse_id):
+        self._db = db
+        self.nurse_id = nurse_id
+        self._patients = {}
+        self._terms = {}
+        self._ids = []      # patient IDs, sorted
+        self._keys = []     # (term, patient_id), sorted
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._watch = None
+        self._waited = False
+        self.version = 0
+
+    def start(self):
+        query = self._db.collection('PATIENTS').where('nurse_id', '==', self.nurse_id)
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _remove(self, patient_id):
+        if self._patients.pop(patient_id, None) is None:
+            return
+        del self._ids[bisect.bisect_left(self._ids, patient_id)]
+        for term in self._terms.pop(patient_id):
+            del self._keys[bisect.bisect_left(self._keys, (term, patient_id))]
+
+    def _add(self, patient_id, data):
+        self._patients[patient_id] = data
+        bisect.insort(self._ids, patient_id)
+        terms = self._terms[patient_id] = search_terms(data)
+        for term in terms:
+            bisect.insort(self._keys, (term, patient_id))
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        # Apply only what changed; the first callback carries every document as ADDED
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                self._remove(doc.id)
+                if change.type.name != 'REMOVED':
+                    self._add(doc.id, doc.to_dict())
+            self.version += 1
+        self._ready.set()
+
+    def wait_ready(self, timeout):
+        # Only the first caller waits for the initial sync; if it didn't
+        # arrive in time, later callers fall back immediately
+        if not self._ready.is_set() and not self._waited:
+            self._waited = True
+            self._ready.wait(timeout)
+        return self._ready.is_set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, patient_id):
+        return self._patients.get(patient_id)
+
+    def matching_ids(self, text):
+        # Sorted patient IDs with a search term starting with text
+        prefix = normalize(text)
+        with self._lock:
+            if not prefix:
+                return list(self._ids)
+            found = set()
+            for term, patient_id in self._keys[bisect.bisect_left(self._keys, (prefix,)):]:
+                if not term.startswith(prefix):
+                    break
+                found.add(patient_id)
+        return sorted(found)
+
+    def page(self, patient_ids, page_size, cursor=None):
+        # Same contract as the Firestore pager: (patients, has_next), with the
+        # last patient_id of the previous page as the cursor
+        start = 0 if cursor is None else bisect.bisect_right(patient_ids, cursor)
+        chosen = patient_ids[start:start + page_size]
+        with self._lock:
+            patients = [self._patients[p] for p in chosen if p in self._patients]
+        return patients, start + page_size < len(patient_ids)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_patient_index(db, nurse_id):
+    with _indexes_lock:
+        index = _indexes.get(nurse_id)
+        if index is None:
+            index = PatientIndex(db, nurse_id)
+            index.start()
+            _indexes[nurse_id] = index
+            while len(_indexes) > PATIENT_INDEX_MAX_NURSES:
+                _, evicted = _indexes.popitem(last=False)
+                evicted.stop()
+        else:
+            _indexes.move_to_end(nurse_id)
+        return index
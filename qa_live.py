@@ -0,0 +1,132 @@
+# qa_live.py
+# Process-wide, push-updated view of the QUESTIONS collection. One Firestore
+# snapshot listener feeds an in-memory map that every session renders from,
+# so steady-state page views cost no reads.
+import bisect
+import os
+import threading
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from instrumentation import track_fragment
+from qa_store import QUESTIONS_COLLECTION
+
+# How often open sessions check the view for changes to the pages they show.
+# The check only compares in-memory pages and reruns the page only when one
+# changed, so a short interval costs no Firestore reads and keeps answers
+# showing up in under a second.
+LIVE_REFRESH_INTERVAL = float(os.getenv('LIVE_REFRESH_INTERVAL', '0.5'))
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _created_at(question):
+    return question.get('created_at') or _EPOCH
+
+
+class QALiveView:
+
+    def __init__(self, db):
+        self._db = db
+        self._questions = {}
+        self._sorted = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._watch = None
+        self._waited = False
+        self.version = 0
+
+    def start(self):
+        self._watch = self._db.collection(QUESTIONS_COLLECTION).on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        # Apply only what changed; the first callback carries every document as ADDED
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    self._questions.pop(doc.id, None)
+                else:
+                    data = doc.to_dict()
+                    data['id'] = doc.id
+                    self._questions[doc.id] = data
+            self._sorted = {}
+            self.version += 1
+        self._ready.set()
+
+    def wait_ready(self, timeout):
+        # Only the first caller waits for the initial sync; if it didn't
+        # arrive in time, later callers fall back immediately
+        if not self._ready.is_set() and not self._waited:
+            self._waited = True
+            self._ready.wait(timeout)
+        return self._ready.is_set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def _by_status(self, answered):
+        # Sorted lists are rebuilt lazily, once per version
+        with self._lock:
+            if answered not in self._sorted:
+                items = sorted(
+                    (q for q in self._questions.values() if q.get('answered') == answered),
+                    key=_created_at,
+                )
+                self._sorted[answered] = (items, [_created_at(q) for q in items])
+            return self._sorted[answered]
+
+    def all_questions(self):
+        with self._lock:
+            return list(self._questions.values())
+
+    def answered_questions(self):
+        return list(self._by_status(True)[0])
+
+    def page(self, answered, page_size, cursor=None):
+        # Same contract as qa_store.list_questions: (questions, has_next)
+        items, keys = self._by_status(answered)
+        start = 0 if cursor is None else bisect.bisect_right(keys, cursor)
+        return items[start:start + page_size], start + page_size < len(items)
+
+
+_view = None
+_view_lock = threading.Lock()
+
+
+def get_live_view(db):
+    global _view
+    with _view_lock:
+        if _view is None:
+            view = QALiveView(db)
+            view.start()
+            _view = view
+        return _view
+
+
+def shown_pages(view, page_size, pages):
+    # What the listed pages look like in the view right now; pages is a list
+    # of (answered, cursor) pairs
+    return [view.page(answered, page_size, cursor) for answered, cursor in pages]
+
+
+def watch_pages(view, page_size, pages):
+    # Remembers what this rerun shows and starts checking it for changes
+    st.session_state.qa_shown = shown_pages(view, page_size, pages)
+    live_updates(view, page_size, pages)
+
+
+@st.fragment(run_every=LIVE_REFRESH_INTERVAL)
+@track_fragment("live updates")
+def live_updates(view, page_size, pages):
+    # Reruns the page only when a change the listener applied alters one of
+    # the pages this session is showing, not on every write anywhere
+    if shown_pages(view, page_size, pages) != st.session_state.get('qa_shown'):
+        st.rerun(scope="app")
@@ -0,0 +1,181 @@
+# qa_store.py
+# Doctor Q&A stored as one document per question in the QUESTIONS collection,
+# replacing the single DOCTOR/1 document (a 'qn' list plus an 'ans' map).
+#
+# Listing by status needs the (answered, created_at) index in
+# firestore.indexes.json.
+#
+# Rewordings of a question merged into it (see question_dedup.py) are kept
+# under 'variants', and 'raised_count' counts how often it was raised.
+#
+# Usage:
+#   python qa_store.py migrate    copy DOCTOR/1 into per-question documents
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+
+QUESTIONS_COLLECTION = 'QUESTIONS'
+
+# Firestore caps a write batch at 500 operations
+BATCH_LIMIT = 500
+
+
+def question_id(question):
+    # Stable document ID, so raising the same question twice is a no-op
+    return hashlib.sha1(question.strip().encode("utf-8")).hexdigest()
+
+
+def _as_dict(snapshot):
+    data = snapshot.to_dict()
+    data['id'] = snapshot.id
+    return data
+
+
+def raise_question(db, question):
+    # create() fails if the document exists, so an answer saved meanwhile
+    # is never overwritten
+    from firebase_admin import firestore
+    from google.api_core.exceptions import AlreadyExists
+
+    question = question.strip()
+    ref = db.collection(QUESTIONS_COLLECTION).document(question_id(question))
+    try:
+        ref.create({
+            'question': question,
+            'answer': None,
+            'answered': False,
+            'created_at': firestore.SERVER_TIMESTAMP,
+        })
+    except AlreadyExists:
+        pass
+    return ref.id
+
+
+def merge_questions(db, canonical, duplicates):
+    # Folds duplicates (dicts with 'id') into the canonical question and
+    # deletes them; the canonical keeps its answer, or takes a duplicate's.
+    # Refuses to merge questions the doctor answered differently.
+    from question_dedup import MAX_VARIANTS, has_conflicting_answers
+
+    if has_conflicting_answers([canonical, *duplicates]):
+        raise ValueError(f"Questions merged into {canonical['id']} have different answers")
+
+    variants = list(canonical.get('variants', []))
+    answer = canonical.get('answer')
+    raised = canonical.get('raised_count', 1)
+    for item in duplicates:
+        for wording in [item['question'], *item.get('variants', [])]:
+            if wording != canonical['question'] and wording not in variants:
+                variants.append(wording)
+        answer = answer or item.get('answer')
+        raised += item.get('raised_count', 1)
+
+    batch = db.batch()
+    batch.update(db.collection(QUESTIONS_COLLECTION).document(canonical['id']), {
+        'variants': variants[:MAX_VARIANTS],
+        'raised_count': raised,
+        'answer': answer,
+        'answered': answer is not None,
+    })
+    pending = 1
+    for item in duplicates:
+        batch.delete(db.collection(QUESTIONS_COLLECTION).document(item['id']))
+        pending += 1
+        if pending == BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+
+def save_answer(db, qid, answer):
+    # Touches only this question's document, so concurrent answers don't conflict
+    from firebase_admin import firestore
+
+    db.collection(QUESTIONS_COLLECTION).document(qid).update({
+        'answer': answer,
+        'answered': True,
+        'answered_at': firestore.SERVER_TIMESTAMP,
+    })
+
+
+def list_questions(db, answered, page_size, cursor=None):
+    # Returns (questions, has_next); cursor is the created_at of the last
+    # question on the previous page
+    query = (
+        db.collection(QUESTIONS_COLLECTION)
+        .where('answered', '==', answered)
+        .order_by('created_at')
+    )
+    if cursor is not None:
+        query = query.start_after({'created_at': cursor})
+    docs = [_as_dict(doc) for doc in query.limit(page_size + 1).stream()]
+    return docs[:page_size], len(docs) > page_size
+
+
+def migrate_from_doctor_doc(db):
+    # Copies every question in DOCTOR/1 into its own document, keeping the
+    # original order through created_at. Safe to re-run: questions already
+    # migrated, or merged into another as a variant, are left alone except
+    # that a missing answer is filled in from DOCTOR/1.
+    doc = db.collection('DOCTOR').document('1').get()
+    data = doc.to_dict() if doc.exists else {}
+    questions = data.get('qn', [])
+    answers = data.get('ans', {})
+    if not isinstance(answers, dict):
+        answers = {}
+
+    # Every wording already stored, mapped to the question document holding it
+    existing = {}
+    owners = {}
+    for snapshot in db.collection(QUESTIONS_COLLECTION).stream():
+        stored = snapshot.to_dict()
+        existing[snapshot.id] = stored
+        for wording in [stored.get('question'), *stored.get('variants', [])]:
+            if wording:
+                owners.setdefault(question_id(wording), snapshot.id)
+    base = datetime.now(timezone.utc)
+
+    migrated = 0
+    batch = db.batch()
+    pending = 0
+    for position, question in enumerate(dict.fromkeys(q.strip() for q in questions if q.strip())):
+        answer = answers.get(question)
+        owner = owners.get(question_id(question))
+        ref = db.collection(QUESTIONS_COLLECTION).document(owner or question_id(question))
+        if owner is None:
+            batch.set(ref, {
+                'question': question,
+                'answer': answer,
+                'answered': answer is not None,
+                'created_at': base + timedelta(microseconds=position),
+            })
+            owners[ref.id] = ref.id
+            migrated += 1
+        elif answer is not None and existing.get(owner, {}).get('answer') is None:
+            batch.update(ref, {'answer': answer, 'answered': True})
+            existing.setdefault(owner, {})['answer'] = answer
+        else:
+            continue
+        pending += 1
+        if pending == BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return migrated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from data_access import get_db
+
+    parser = argparse.ArgumentParser(description="Doctor Q&A store maintenance")
+    parser.add_argument("command", choices=["migrate"])
+    args = parser.parse_args()
+
+    count = migrate_from_doctor_doc(get_db())
+    print(f"Migrated {count} questions from DOCTOR/1.")
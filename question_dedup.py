@@ -0,0 +1,280 @@
+# question_dedup.py
+# Near-duplicate detection for raised questions. Each question is reduced to
+# a MinHash signature over character shingles of its words, and signatures
+# are bucketed with LSH banding, so finding likely rewordings of a new
+# question only compares it against the few questions sharing a band.
+#
+# Questions that differ only slightly in wording can still be clinically
+# different ("age 17" vs "age 76", "CrCl 25" vs "CrCl 35"), so a match also
+# needs exactly the same numbers, and matches are only ever offered as
+# possibly related: raising a question always adds it to the doctor's queue.
+# Merging is a separate, reviewed step.
+#
+# Usage:
+#   python question_dedup.py dedup              list the merges it would make
+#   python question_dedup.py dedup --apply      merge them
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from retrieval import tokenize
+
+# Estimated Jaccard similarity above which two questions (with the same
+# numbers) count as duplicates
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', '0.8'))
+
+# 20 bands of 3 rows: pairs at 0.8 similarity share at least one band almost
+# always, pairs at 0.2 about 15% (and are then rejected on score)
+NUM_BANDS = 20
+ROWS_PER_BAND = 3
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+
+SHINGLE_SIZE = 4
+
+# Earlier wordings kept on a canonical question, so its document stays small
+MAX_VARIANTS = 20
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes; fixed seed
+# so signatures are stable across processes
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def numbers(text):
+    # Doses, ages, lab values and the like; "2.0" and "2" are the same value
+    return frozenset(float(n) for n in _NUMBER.findall(text))
+
+
+def shingles(text):
+    # Character shingles of each word, so word order and inflections
+    # ("enrol", "enrolled") only change a few shingles
+    found = set()
+    for token in tokenize(text):
+        padded = f" {token} "
+        if len(padded) <= SHINGLE_SIZE:
+            found.add(padded)
+        else:
+            found.update(padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1))
+    return found
+
+
+def signature(text):
+    values = shingles(text)
+    if not values:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in values), dtype=np.uint64, count=len(values))
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def similarity(sig_a, sig_b):
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def _bands(sig):
+    return [(band, sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()) for band in range(NUM_BANDS)]
+
+
+class QuestionDedupIndex:
+    # Each wording of a question (the question itself and the variants merged
+    # into it) is indexed as its own entry, keyed (qid, position), so a new
+    # question is compared with every wording separately and a question
+    # scores as its best-matching wording.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._signatures = {}
+        self._numbers = {}
+        self._wordings = {}
+        self._payloads = {}
+        self._buckets = {}
+        self._synced_version = None
+
+    def add(self, qid, wordings, payload):
+        # Re-adding an existing qid replaces all of its wordings
+        wordings = tuple(wordings)
+        signatures = [signature(text) for text in wordings]
+        with self._lock:
+            self._remove(qid)
+            self._payloads[qid] = payload
+            self._wordings[qid] = wordings
+            for position, (text, sig) in enumerate(zip(wordings, signatures)):
+                if sig is None:
+                    continue
+                key = (qid, position)
+                self._signatures[key] = sig
+                self._numbers[key] = numbers(text)
+                for band in _bands(sig):
+                    self._buckets.setdefault(band, set()).add(key)
+
+    def _remove(self, qid):
+        self._payloads.pop(qid, None)
+        for position in range(len(self._wordings.pop(qid, ()))):
+            key = (qid, position)
+            self._numbers.pop(key, None)
+            sig = self._signatures.pop(key, None)
+            if sig is None:
+                continue
+            for band in _bands(sig):
+                bucket = self._buckets.get(band)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[band]
+
+    def remove(self, qid):
+        with self._lock:
+            self._remove(qid)
+
+    def similar(self, text, threshold=DUPLICATE_THRESHOLD, exclude=None):
+        # Returns [(similarity, payload)] best first; only wordings with
+        # exactly the same numbers are candidates
+        sig = signature(text)
+        if sig is None:
+            return []
+        values = numbers(text)
+        with self._lock:
+            candidates = set()
+            for band in _bands(sig):
+                candidates.update(self._buckets.get(band, ()))
+            best = {}
+            for key in candidates:
+                qid = key[0]
+                if qid == exclude or self._numbers[key] != values:
+                    continue
+                best[qid] = max(best.get(qid, 0.0), similarity(sig, self._signatures[key]))
+            return [
+                (score, self._payloads[qid])
+                for qid, score in sorted(best.items(), key=lambda item: (-item[1], item[0]))
+                if score >= threshold
+            ]
+
+    def sync(self, view):
+        # Mirrors the live Q&A view: new or reworded questions are
+        # (re)indexed, merged-away ones dropped
+        if view is None or not view.ready:
+            return
+        with self._sync_lock:
+            if view.version == self._synced_version:
+                return
+            version = view.version
+            current = {item['id']: item for item in view.all_questions()}
+            with self._lock:
+                stale = [qid for qid in self._payloads if qid not in current]
+                for qid in stale:
+                    self._remove(qid)
+            for qid, item in current.items():
+                if self._wordings.get(qid) != tuple(wordings(item)) or self._payloads.get(qid) != item:
+                    self.add(qid, wordings(item), item)
+            self._synced_version = version
+
+
+def wordings(item):
+    # The question and the earlier wordings merged into it; a future
+    # rewording of any of them is a match
+    return [item['question'], *item.get('variants', [])]
+
+
+def canonical_order(item):
+    # Answered questions win, then the earliest raised
+    return (not item.get('answered'), item.get('created_at') is None, item.get('created_at'), item['id'])
+
+
+def find_clusters(questions, threshold=DUPLICATE_THRESHOLD):
+    # Groups near-duplicate questions; returns lists of two or more, each
+    # with its canonical question first
+    index = QuestionDedupIndex()
+    for item in questions:
+        index.add(item['id'], wordings(item), item)
+
+    parent = {item['id']: item['id'] for item in questions}
+
+    def root(qid):
+        while parent[qid] != qid:
+            parent[qid] = parent[parent[qid]]
+            qid = parent[qid]
+        return qid
+
+    for item in questions:
+        for text in wordings(item):
+            for _, other in index.similar(text, threshold, exclude=item['id']):
+                a, b = root(item['id']), root(other['id'])
+                if a != b:
+                    parent[b] = a
+
+    groups = {}
+    for item in questions:
+        groups.setdefault(root(item['id']), []).append(item)
+    return [sorted(group, key=canonical_order) for group in groups.values() if len(group) > 1]
+
+
+def has_conflicting_answers(cluster):
+    # The doctor answered some of these questions differently; merging would
+    # keep only one answer, so such clusters are left for manual review
+    answers = {item['answer'].strip() for item in cluster if item.get('answer')}
+    return len(answers) > 1
+
+
+def dedup_questions(db, threshold=DUPLICATE_THRESHOLD, apply=False):
+    # Finds every cluster of near-duplicates, canonical question first. Only
+    # with apply=True are they merged (duplicates are deleted), and never
+    # when the doctor's answers within a cluster differ.
+    import qa_store
+
+    questions = [qa_store._as_dict(snapshot) for snapshot in db.collection(qa_store.QUESTIONS_COLLECTION).stream()]
+    clusters = find_clusters(questions, threshold)
+    if apply:
+        for canonical, *duplicates in clusters:
+            if not has_conflicting_answers([canonical, *duplicates]):
+                qa_store.merge_questions(db, canonical, duplicates)
+    return clusters
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = QuestionDedupIndex()
+        return _index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from data_access import get_db
+
+    parser = argparse.ArgumentParser(description="Find and merge near-duplicate raised questions")
+    parser.add_argument("command", choices=["dedup"])
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+    parser.add_argument("--apply", action="store_true", help="merge the listed questions (deletes the duplicates)")
+    args = parser.parse_args()
+
+    clusters = dedup_questions(get_db(), args.threshold, apply=args.apply)
+    mergeable = [cluster for cluster in clusters if not has_conflicting_answers(cluster)]
+    for canonical, *duplicates in clusters:
+        print(canonical['question'])
+        for item in duplicates:
+            print(f"  <- {item['question']}")
+        if not has_conflicting_answers([canonical, *duplicates]):
+            continue
+        print("  (not merged: answered differently)")
+        for item in [canonical, *duplicates]:
+            if item.get('answer'):
+                print(f"    {item['question']}: {item['answer']}")
+    count = sum(len(cluster) - 1 for cluster in mergeable)
+    if args.apply:
+        print(f"{count} duplicate questions merged.")
+    else:
+        print(f"{count} duplicate questions found. Review them, then rerun with --apply to merge.")
@@ -0,0 +1,90 @@
+# report_cache.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from response_codec import read_responses
+
+
+def report_key(patient_info):
+    # Hash every field that ends up in the PDF, so editing a patient's
+    # responses or conclusion produces a new key and the old bytes age out.
+    payload = {
+        'patient_id': patient_info.get('patient_id'),
+        'nurse_id': patient_info.get('nurse_id'),
+        'subject_name': patient_info.get('subject_name'),
+        'conclusion': patient_info.get('conclusion'),
+        # Decoded, so a legacy document and its migrated form share a key
+        'responses': read_responses(patient_info),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ReportCache:
+    # Bounded LRU of rendered PDF bytes, capped by total size rather than
+    # entry count. Shared by every session in the process.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, patient_info, render):
+        key = report_key(patient_info)
+        with self._lock:
+            pdf_bytes = self._entries.get(key)
+            if pdf_bytes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pdf_bytes
+            self.misses += 1
+
+        # Render outside the lock so one slow PDF doesn't block other sessions
+        pdf_bytes = render()
+        self._put(key, pdf_bytes)
+        return pdf_bytes
+
+    def _put(self, key, pdf_bytes):
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = pdf_bytes
+            self._size += len(pdf_bytes)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# app.py is re-executed on every rerun, so the shared instance lives here
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache(max_bytes):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReportCache(max_bytes)
+        return _cache
@@ -0,0 +1,77 @@
+# reports.py
+# PDF rendering for patient reports. Kept free of Streamlit and Firebase
+# imports so it can be loaded cheaply by worker processes.
+import io
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph
+from reportlab.pdfgen import canvas
+
+from criteria import exclusion_criteria, exclusion_keys
+from instrumentation import timed
+from response_codec import read_responses
+
+
+@timed("pdf.render")
+def generate_pdf(patient_data, nurse_id, patient_id):
+    # Create PDF in memory
+    pdf_buffer = io.BytesIO()
+
+    try:
+        c = canvas.Canvas(pdf_buffer, pagesize=letter)
+        width, height = letter
+        c.setFont("Helvetica", 14)
+
+        # Creating styles for alignment
+        styles = getSampleStyleSheet()
+        style_normal = styles["Normal"]
+        style_normal.fontName = "Helvetica"
+        style_normal.fontSize = 14
+
+        # Adding content to the PDF using Paragraph for better alignment
+        c.drawString(100, height - 50, f"Patient Report for ID: {patient_id}")
+        c.drawString(100, height - 70, f"Nurse ID: {nurse_id}")
+        c.drawString(100, height - 90, f"Name: {patient_data.get('subject_name', 'N/A')}")
+        c.drawString(100, height - 110, f"Patient ID: {patient_id}")
+
+        conclusion = patient_data.get('conclusion', '')
+        
+        # Check if the patient is excluded
+        if conclusion == "Excluded":
+            exclusion_criteria_violations = []
+            
+            # Decode the responses, packed or legacy map
+            responses = read_responses(patient_data)
+
+            # Check the responses for each exclusion question and add to the list if 'yes'
+            for exclusion_key, exclusion_question in zip(exclusion_keys, exclusion_criteria):
+                response = responses.get(exclusion_key, "").lower()
+                if response == "yes":
+                    exclusion_criteria_violations.append(f"Question: {exclusion_question}")
+
+            # If there are any violations, add them to the PDF
+            if exclusion_criteria_violations:
+                c.drawString(100, height - 140, "Exclusion Criteria Violations:")
+                y_position = height - 160
+
+                # Using Paragraph for better text wrapping
+                for violation in exclusion_criteria_violations:
+                    para = Paragraph(violation, style_normal)
+                    para_width = width - 200  # Set max width to fit the page
+                    para_height = para.wrap(para_width, 100)[1]  # Wrap the text
+                    para.drawOn(c, 100, y_position - para_height)
+                    y_position -= (para_height + 10)  # Adjust y-position after each paragraph
+
+        elif conclusion == "Eligible":
+            para = Paragraph("Patient is eligible.", style_normal)
+            para_width = width - 200
+            para_height = para.wrap(para_width, 100)[1]
+            para.drawOn(c, 100, height - 140 - para_height)
+
+        # Save the PDF to buffer
+        c.save()
+        pdf_buffer.seek(0)
+        return pdf_buffer.getvalue()
+
+    except Exception as e:
+        raise RuntimeError(f"Error generating PDF for patient {patient_id}: {e}") from e
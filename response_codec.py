@@ -0,0 +1,139 @@
+# response_codec.py
+# Compact storage for assessment responses: two bits per answer packed into
+# a bytes field, tagged with the version of the criteria set it was encoded
+# against. Replaces the 49-entry 'responses' map of strings.
+#
+#   {'responses': {'inclusion_1': 'yes', ...}}            legacy, ~2 KB
+#   {'responses_packed': b'...', 'criteria_version': 1}   13 bytes
+#
+# Legacy documents are converted lazily, the first time they are read.
+import logging
+
+import numpy as np
+
+from criteria import response_keys
+
+logger = logging.getLogger(__name__)
+
+CRITERIA_VERSION = 1
+
+# Key order for each criteria set version. A protocol amendment that adds or
+# reorders questions gets a new version; existing entries must never change.
+CRITERIA_SETS = {
+    1: list(response_keys),
+}
+
+# 2-bit codes; 0 means the question wasn't answered
+MISSING = 0
+YES = 1
+NO = 2
+NOT_SURE = 3
+
+_CODES = {"yes": YES, "no": NO, "not sure": NOT_SURE}
+_ANSWERS = {YES: "yes", NO: "no", NOT_SURE: "not sure"}
+_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+
+def _keys(version):
+    if version not in CRITERIA_SETS:
+        raise ValueError(f"Unknown criteria version: {version}")
+    return CRITERIA_SETS[version]
+
+
+def pack(responses, version=CRITERIA_VERSION):
+    keys = _keys(version)
+    packed = bytearray((len(keys) + 3) // 4)
+    for i, key in enumerate(keys):
+        answer = responses.get(key)
+        code = _CODES.get(answer.strip().lower(), MISSING) if isinstance(answer, str) else MISSING
+        packed[i // 4] |= code << (2 * (i % 4))
+    return bytes(packed)
+
+
+def unpack(packed, version=CRITERIA_VERSION):
+    keys = _keys(version)
+    responses = {}
+    for i, key in enumerate(keys):
+        code = (packed[i // 4] >> (2 * (i % 4))) & 0b11
+        if code != MISSING:
+            responses[key] = _ANSWERS[code]
+    return responses
+
+
+def codes_matrix(packed_list, version=CRITERIA_VERSION):
+    # (patients x criteria) uint8 array of 2-bit codes, unpacked in one pass
+    keys = _keys(version)
+    width = (len(keys) + 3) // 4
+    raw = np.frombuffer(b"".join(packed_list), dtype=np.uint8).reshape(-1, width)
+    codes = (raw[:, :, None] >> _SHIFTS) & 0b11
+    return codes.reshape(raw.shape[0], width * 4)[:, :len(keys)]
+
+
+def is_legacy(doc):
+    return 'responses_packed' not in doc and 'responses' in doc
+
+
+def read_responses(doc):
+    # Responses as a {key: answer} map, whichever format the document uses
+    if 'responses_packed' in doc:
+        return unpack(doc['responses_packed'], doc.get('criteria_version', CRITERIA_VERSION))
+    return dict(doc.get('responses', {}))
+
+
+def read_packed(doc):
+    # Packed bytes in the current criteria version, converting if needed
+    if 'responses_packed' in doc and doc.get('criteria_version', CRITERIA_VERSION) == CRITERIA_VERSION:
+        return doc['responses_packed']
+    return pack(read_responses(doc))
+
+
+def encode_document(patient_data):
+    # Copy of a patient document with the responses map swapped for the packed form
+    encoded = {k: v for k, v in patient_data.items() if k != 'responses'}
+    encoded['responses_packed'] = pack(patient_data.get('responses', {}))
+    encoded['criteria_version'] = CRITERIA_VERSION
+    return encoded
+
+
+def migration_fields(doc):
+    # Update that converts a legacy document in place
+    from firebase_admin import firestore
+
+    return {
+        'responses_packed': pack(doc.get('responses', {})),
+        'criteria_version': CRITERIA_VERSION,
+        'responses': firestore.DELETE_FIELD,
+    }
+
+
+def migrate_legacy(db, snapshots):
+    # Converts any legacy documents among already-read snapshots; returns how
+    # many were migrated
+    return convert_legacy(db, [snapshot.reference for snapshot in snapshots if is_legacy(snapshot.to_dict() or {})])
+
+
+def convert_legacy(db, refs):
+    # Converts the referenced documents that are still legacy. They are
+    # re-read in a transaction, so a document resubmitted since the caller
+    # read it isn't overwritten with its old answers. Best effort: a failure
+    # is logged and the documents are left for the next read to convert.
+    from firebase_admin import firestore
+
+    if not refs:
+        return 0
+
+    @firestore.transactional
+    def convert(transaction):
+        migrated = 0
+        for snapshot in db.get_all(refs, transaction=transaction):
+            doc = snapshot.to_dict() if snapshot.exists else None
+            if doc is not None and is_legacy(doc):
+                transaction.update(snapshot.reference, migration_fields(doc))
+                migrated += 1
+        return migrated
+
+    try:
+        return convert(db.transaction())
+    except Exception:
+        logger.exception("Converting %d legacy patient documents failed", len(refs))
+        return 0
@@ -0,0 +1,194 @@
+# retrieval.py
+# Local BM25 retrieval over the screening criteria and answered doctor Q&A,
+# used by the Criteria Assistant chat. The index is built once per process
+# and grows incrementally as new answers arrive; no external service is used.
+import re
+import threading
+
+import numpy as np
+
+from criteria import exclusion_criteria, inclusion_criteria
+
+K1 = 1.5
+B = 0.75
+
+# Replaced and removed documents are dropped from the index once there are at
+# least this many and they outnumber the live ones
+COMPACT_MIN_DEAD = 64
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and any are as at be been by can do does for from has have how i if in is it its "
+    "of on or should subject that the there this to was what when which who will with".split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.docs = []
+        self._lengths = []
+        self._counts = []
+        self._live = []
+        self._dead = 0
+        self._postings = {}
+        self._arrays = {}
+        self._keys = {}
+
+    def add(self, key, text, payload):
+        # Re-adding an existing key replaces its document
+        counts = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        with self._lock:
+            if key in self._keys:
+                self._live[self._keys[key]] = False
+                self._dead += 1
+            self._append(key, payload, counts)
+            self._maybe_compact()
+
+    def _append(self, key, payload, counts):
+        doc_id = len(self.docs)
+        self.docs.append(payload)
+        self._lengths.append(sum(counts.values()))
+        self._counts.append(counts)
+        self._live.append(True)
+        self._keys[key] = doc_id
+        for term, tf in counts.items():
+            doc_ids, tfs = self._postings.setdefault(term, ([], []))
+            doc_ids.append(doc_id)
+            tfs.append(tf)
+            # Only this term's NumPy arrays need rebuilding
+            self._arrays.pop(term, None)
+
+    def _maybe_compact(self):
+        # Rebuilds the index from the live documents so replaced and removed
+        # ones don't accumulate
+        if self._dead < COMPACT_MIN_DEAD or self._dead <= len(self.docs) - self._dead:
+            return
+        live = [(key, self.docs[doc_id], self._counts[doc_id]) for key, doc_id in self._keys.items()]
+        self.docs = []
+        self._lengths = []
+        self._counts = []
+        self._live = []
+        self._dead = 0
+        self._postings = {}
+        self._arrays = {}
+        self._keys = {}
+        for key, payload, counts in live:
+            self._append(key, payload, counts)
+
+    def remove(self, key):
+        with self._lock:
+            doc_id = self._keys.pop(key, None)
+            if doc_id is not None:
+                self._live[doc_id] = False
+                self._dead += 1
+                self._maybe_compact()
+
+    def keys(self):
+        with self._lock:
+            return list(self._keys)
+
+    def get(self, key):
+        with self._lock:
+            doc_id = self._keys.get(key)
+            return self.docs[doc_id] if doc_id is not None else None
+
+    def search(self, query, k=5, kind=None):
+        # Returns [(score, payload)] best first, optionally limited to one kind
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.docs)
+            if not n or not terms:
+                return []
+            lengths = np.asarray(self._lengths, dtype=np.float64)
+            live = np.asarray(self._live, dtype=bool)
+            avgdl = lengths[live].mean() if live.any() else 1.0
+            norm = K1 * (1 - B + B * lengths / max(avgdl, 1e-9))
+            live_count = int(live.sum())
+
+            scores = np.zeros(n)
+            for term in terms:
+                if term not in self._postings:
+                    continue
+                if term not in self._arrays:
+                    doc_ids, tfs = self._postings[term]
+                    self._arrays[term] = (np.asarray(doc_ids), np.asarray(tfs, dtype=np.float64))
+                doc_ids, tfs = self._arrays[term]
+                df = int(live[doc_ids].sum())
+                if not df:
+                    continue
+                idf = np.log(1 + (live_count - df + 0.5) / (df + 0.5))
+                scores[doc_ids] += idf * tfs * (K1 + 1) / (tfs + norm[doc_ids])
+
+            scores[~live] = 0.0
+            if kind is not None:
+                scores[[doc['kind'] != kind for doc in self.docs]] = 0.0
+            top = np.argsort(-scores)[:k]
+            return [(float(scores[i]), self.docs[i]) for i in top if scores[i] > 0]
+
+
+class CriteriaAssistant:
+    # Criteria are indexed up front; answered questions are pulled from the
+    # live Q&A view whenever its version moves on, and dropped once they
+    # leave it (deleted, merged away or no longer answered).
+
+    def __init__(self):
+        self.index = BM25Index()
+        self._synced_version = None
+        self._sync_lock = threading.Lock()
+        for number, text in enumerate(inclusion_criteria, start=1):
+            self.index.add(f"inclusion_{number}", text, {'kind': 'criterion', 'label': f"Inclusion {number}", 'text': text})
+        offset = len(inclusion_criteria)
+        for number, text in enumerate(exclusion_criteria, start=offset + 1):
+            self.index.add(f"exclusion_{number}", text, {'kind': 'criterion', 'label': f"Exclusion {number}", 'text': text})
+
+    def sync(self, view):
+        if view is None or not view.ready:
+            return
+        with self._sync_lock:
+            if view.version == self._synced_version:
+                return
+            version = view.version
+            answered = view.answered_questions()
+            answered_keys = {f"qa_{item['id']}" for item in answered}
+            for key in self.index.keys():
+                if key.startswith('qa_') and key not in answered_keys:
+                    self.index.remove(key)
+            for item in answered:
+                key = f"qa_{item['id']}"
+                answer = item.get('answer') or ''
+                indexed = self.index.get(key)
+                if indexed is not None and indexed['answer'] == answer:
+                    continue
+                self.index.add(key, f"{item['question']} {answer}", {
+                    'kind': 'answer',
+                    'id': item['id'],
+                    'question': item['question'],
+                    'answer': answer,
+                })
+            self._synced_version = version
+
+    def ask(self, query, criteria_k=3, answers_k=3):
+        return {
+            'criteria': self.index.search(query, criteria_k, kind='criterion'),
+            'answers': self.index.search(query, answers_k, kind='answer'),
+        }
+
+
+_assistant = None
+_assistant_lock = threading.Lock()
+
+
+def get_assistant():
+    global _assistant
+    with _assistant_lock:
+        if _assistant is None:
+            _assistant = CriteriaAssistant()
+        return _assistant
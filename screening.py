@@ -0,0 +1,241 @@
+# screening.py
+# Batch screening engine. Responses are encoded as a tri-state matrix
+# (patients x criteria) so conclusions for any number of patients are
+# computed in a single vectorized pass.
+#
+# Usage:
+#   python screening.py rescreen [--dry-run]     re-screen every stored patient
+#   python screening.py ingest FILE [--dry-run]  screen a partner-site CSV/Parquet log
+import argparse
+import math
+
+import numpy as np
+
+from criteria import inclusion_keys, response_keys
+from patient_ids import patient_id_error
+import response_codec
+
+# Tri-state answer codes. Missing or unrecognised answers count as NOT_SURE,
+# which matches how an incomplete assessment is treated in the app.
+NO = 0
+YES = 1
+NOT_SURE = 2
+
+ANSWER_CODES = {"no": NO, "yes": YES, "not sure": NOT_SURE}
+
+ELIGIBLE = "Eligible"
+EXCLUDED = "Excluded"
+UNCONCLUDED = "Unconcluded"
+
+_exclusion_columns = np.arange(len(inclusion_keys), len(response_keys))
+
+# Firestore caps a write batch at 500 operations
+BATCH_LIMIT = 500
+
+
+def _code(answer):
+    if answer is None:
+        return NOT_SURE
+    return ANSWER_CODES.get(str(answer).strip().lower(), NOT_SURE)
+
+
+def encode_responses(responses_list):
+    # responses_list: iterable of 'responses' maps keyed like criteria.response_keys
+    rows = [[_code(responses.get(key)) for key in response_keys] for responses in responses_list]
+    return np.array(rows, dtype=np.int8).reshape(len(rows), len(response_keys))
+
+
+# Packed 2-bit codes (missing, yes, no, not sure) to tri-state answers
+_PACKED_TO_TRISTATE = np.array([NOT_SURE, YES, NO, NOT_SURE], dtype=np.int8)
+
+
+def encode_documents(docs):
+    # Patient documents in either storage format; packed responses are
+    # unpacked for all rows at once
+    packed = [response_codec.read_packed(doc) for doc in docs]
+    if not packed:
+        return np.zeros((0, len(response_keys)), dtype=np.int8)
+    return _PACKED_TO_TRISTATE[response_codec.codes_matrix(packed)]
+
+
+def evaluate(matrix):
+    # Any 'not sure' leaves the patient unconcluded; otherwise any 'yes' to an
+    # exclusion criterion excludes them.
+    unconcluded = (matrix == NOT_SURE).any(axis=1)
+    excluded = (matrix[:, _exclusion_columns] == YES).any(axis=1)
+    conclusions = np.full(matrix.shape[0], ELIGIBLE, dtype=object)
+    conclusions[excluded] = EXCLUDED
+    conclusions[unconcluded] = UNCONCLUDED
+    return conclusions
+
+
+def fired_exclusions(matrix):
+    # Boolean (patients x exclusion criteria) mask of answered-yes exclusions
+    return matrix[:, _exclusion_columns] == YES
+
+
+def conclude(responses):
+    return evaluate(encode_responses([responses]))[0]
+
+
+def _text(value):
+    # Parquet columns keep their types: missing values come back as None or
+    # NaN, and a numeric ID column with gaps as floats (1001.0)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def load_screening_log(path):
+    # Partner-site logs: one row per patient with patient_id, nurse_id,
+    # subject_name and one column per response key.
+    import pandas as pd
+
+    if path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+
+    missing = [key for key in ['patient_id'] + response_keys if key not in frame.columns]
+    if missing:
+        raise ValueError(f"Screening log is missing columns: {', '.join(missing)}")
+
+    patients = []
+    for record in frame.to_dict(orient="records"):
+        patients.append({
+            'patient_id': _text(record['patient_id']).strip(),
+            'nurse_id': _text(record.get('nurse_id')),
+            'subject_name': _text(record.get('subject_name')),
+            'responses': {key: _text(record[key]).strip().lower() for key in response_keys},
+        })
+    return patients
+
+
+def screen_patients(patients):
+    # Fills in 'conclusion' for every patient dict and returns them
+    conclusions = evaluate(encode_documents(patients))
+    for patient, conclusion in zip(patients, conclusions):
+        patient['conclusion'] = conclusion
+    return patients
+
+
+def write_conclusions(db, updates, merge=True):
+    # updates: iterable of (patient_id, fields) pairs, written in batches
+    written = 0
+    batch = db.batch()
+    pending = 0
+    for patient_id, fields in updates:
+        batch.set(db.collection('PATIENTS').document(patient_id), fields, merge=merge)
+        pending += 1
+        if pending == BATCH_LIMIT:
+            batch.commit()
+            written += pending
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+        written += pending
+    return written
+
+
+def rescreen_all(db, dry_run=False):
+    # Re-evaluates every stored patient against the current criteria and
+    # writes back only the conclusions that changed (plus legacy documents
+    # that need converting to the packed format).
+    snapshots = list(db.collection('PATIENTS').stream())
+    if not snapshots:
+        return 0
+    docs = [snapshot.to_dict() for snapshot in snapshots]
+    previous = [doc.get('conclusion') for doc in docs]
+    legacy = [response_codec.is_legacy(doc) for doc in docs]
+    screen_patients(docs)
+    # Legacy documents are converted to the packed form while we're here
+    changed = [
+        (snapshot.id, {
+            'conclusion': doc['conclusion'],
+            **(response_codec.migration_fields(doc) if is_legacy else {}),
+        })
+        for snapshot, doc, before, is_legacy in zip(snapshots, docs, previous, legacy)
+        if doc['conclusion'] != before or is_legacy
+    ]
+    if dry_run:
+        return len(changed)
+    return write_conclusions(db, changed)
+
+
+def existing_patient_ids(db, patient_ids):
+    # The subset of patient_ids that already have a PATIENTS document
+    found = set()
+    patient_ids = list(patient_ids)
+    for start in range(0, len(patient_ids), BATCH_LIMIT):
+        refs = [db.collection('PATIENTS').document(p) for p in patient_ids[start:start + BATCH_LIMIT]]
+        found.update(snapshot.id for snapshot in db.get_all(refs) if snapshot.exists)
+    return found
+
+
+def ingest_screening_log(db, path, dry_run=False):
+    # Returns (patients written, patient IDs skipped as already on file,
+    # [(patient_id, reason)] for rows whose ID can't be stored). Patients
+    # already on file are left untouched rather than overwritten by the log.
+    from firebase_admin import firestore
+
+    valid, invalid = [], []
+    for patient in load_screening_log(path):
+        error = patient_id_error(patient['patient_id'])
+        if error is None:
+            valid.append(patient)
+        else:
+            invalid.append((patient['patient_id'], error))
+    patients = screen_patients(valid)
+    existing = existing_patient_ids(db, {p['patient_id'] for p in patients})
+    skipped = sorted({p['patient_id'] for p in patients if p['patient_id'] in existing})
+    patients = [p for p in patients if p['patient_id'] not in existing]
+    if dry_run:
+        return len(patients), skipped, invalid
+    written = write_conclusions(
+        db,
+        (
+            (p['patient_id'], {**response_codec.encode_document(p), 'submitted_at': firestore.SERVER_TIMESTAMP})
+            for p in patients
+        ),
+        merge=False,
+    )
+    return written, skipped, invalid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch eligibility screening")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rescreen = subparsers.add_parser("rescreen", help="Re-screen every stored patient")
+    rescreen.add_argument("--dry-run", action="store_true")
+    ingest = subparsers.add_parser("ingest", help="Screen and store a CSV/Parquet screening log")
+    ingest.add_argument("path")
+    ingest.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from data_access import get_db
+
+    db = get_db()
+    if args.command == "rescreen":
+        count = rescreen_all(db, dry_run=args.dry_run)
+        print(f"{count} conclusions {'would change' if args.dry_run else 'updated'}.")
+    else:
+        count, skipped, invalid = ingest_screening_log(db, args.path, dry_run=args.dry_run)
+        print(f"{count} patients {'screened' if args.dry_run else 'written'}.")
+        if skipped:
+            print(f"{len(skipped)} patients already on file, skipped: {', '.join(skipped)}")
+        for patient_id, error in invalid:
+            print(f"Skipped row with patient ID {patient_id!r}: {error}")
+
+    # Bulk writes bypass the per-submission counter updates, so recompute them
+    if count and not args.dry_run:
+        import screening_stats
+
+        screening_stats.rebuild(db)
+        print("Statistics rebuilt.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# screening_stats.py
+# Enrollment statistics kept as counters that are updated in the same
+# transaction as each patient submission, instead of being computed by
+# scanning PATIENTS. Counters are spread over a fixed number of shard
+# documents so concurrent submissions don't contend on one document; the
+# statistics page reads exactly STATS_SHARDS documents, whatever the trial size.
+#
+# Shard layout (all counts are summed across shards):
+#   {'total': n,
+#    'conclusions': {'Eligible': n, 'Excluded': n, 'Unconcluded': n},
+#    'exclusions': {'exclusion_31': n, ...},      # criteria answered 'yes'
+#    'nurses': {nurse_id: {'total': n, 'Eligible': n, ...}}}
+#
+# Usage:
+#   python screening_stats.py rebuild    recompute every counter from PATIENTS
+import os
+import random
+
+
+import drafts
+from criteria import exclusion_keys
+from response_codec import read_responses
+
+STATS_COLLECTION = 'STATS'
+STATS_SHARDS = int(os.getenv('STATS_SHARDS', '10'))
+
+
+def shard_refs(db):
+    return [db.collection(STATS_COLLECTION).document(f"shard_{i}") for i in range(STATS_SHARDS)]
+
+
+def _bump(counts, path, n):
+    *parents, leaf = path
+    for key in parents:
+        counts = counts.setdefault(key, {})
+    counts[leaf] = counts.get(leaf, 0) + n
+
+
+def _count_patient(counts, doc, n):
+    # Adds (n=1) or removes (n=-1) one patient's contribution
+    conclusion = doc.get('conclusion') or 'Unknown'
+    nurse_id = doc.get('nurse_id') or 'unknown'
+    _bump(counts, ('total',), n)
+    _bump(counts, ('conclusions', conclusion), n)
+    _bump(counts, ('nurses', nurse_id, 'total'), n)
+    _bump(counts, ('nurses', nurse_id, conclusion), n)
+    responses = read_responses(doc)
+    for key in exclusion_keys:
+        if responses.get(key) == 'yes':
+            _bump(counts, ('exclusions', key), n)
+
+
+def submission_delta(previous, current):
+    # Counter changes for replacing 'previous' (None for a new patient) with 'current'
+    delta = {}
+    if previous is not None:
+        _count_patient(delta, previous, -1)
+    _count_patient(delta, current, 1)
+    return delta
+
+
+def _as_increments(delta):
+    # Nested Increment transforms, dropping counters that net to zero
+    from firebase_admin import firestore
+
+    increments = {}
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            nested = _as_increments(value)
+            if nested:
+                increments[key] = nested
+        elif value:
+            increments[key] = firestore.Increment(value)
+    return increments
+
+
+def _merge_counts(target, counts):
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            _merge_counts(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def write_submissions(db, payloads):
+    # Stores patient documents, deletes their drafts and updates the counters
+    # atomically. The previous version of each patient is read inside the
+    # transaction so a resubmission moves its counts rather than adding to them.
+    from firebase_admin import firestore
+
+    patient_refs = [db.collection('PATIENTS').document(p['patient_id']) for p in payloads]
+    shard = shard_refs(db)[random.randrange(STATS_SHARDS)]
+
+    @firestore.transactional
+    def apply(transaction):
+        previous = {
+            snapshot.id: snapshot.to_dict()
+            for snapshot in db.get_all(patient_refs, transaction=transaction)
+            if snapshot.exists
+        }
+        delta = {}
+        for ref, payload in zip(patient_refs, payloads):
+            _merge_counts(delta, submission_delta(previous.get(ref.id), payload))
+            transaction.set(ref, payload)
+            transaction.delete(drafts.draft_ref(db, payload.get('nurse_id'), ref.id))
+        increments = _as_increments(delta)
+        if increments:
+            transaction.set(shard, increments, merge=True)
+
+    apply(db.transaction())
+
+
+def load_stats(db):
+    totals = {}
+    for snapshot in db.get_all(shard_refs(db)):
+        if snapshot.exists:
+            _merge_counts(totals, snapshot.to_dict())
+    return totals
+
+
+def rebuild(db):
+    # Recomputes the counters from scratch. Run it while no submissions are
+    # being flushed, otherwise increments landing mid-rebuild are lost.
+    totals = {}
+    patients = 0
+    for snapshot in db.collection('PATIENTS').stream():
+        _count_patient(totals, snapshot.to_dict(), 1)
+        patients += 1
+
+    batch = db.batch()
+    for i, ref in enumerate(shard_refs(db)):
+        batch.set(ref, totals if i == 0 else {})
+    batch.commit()
+    return patients
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from data_access import get_db
+
+    parser = argparse.ArgumentParser(description="Screening statistics maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    count = rebuild(get_db())
+    print(f"Rebuilt statistics from {count} patients.")
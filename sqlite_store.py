@@ -0,0 +1,592 @@
+# sqlite_store.py
+# Local SQLite storage backend for sites that can't reach Firestore, and a
+# deterministic fixture for tests and benchmarks. Selected with
+# STORAGE_BACKEND=sqlite (see data_access.get_db).
+#
+# The storage interface is the subset of the Firestore client the app uses,
+# so every module keeps working unchanged against either backend:
+#   client.collection(name).document(id).get() / create(data) / set(data, merge) / update(fields) / delete()
+#   collection.where(field, op, value).order_by(field).start_after(values).limit(n)
+#   query.stream() / get() / count().get() / on_snapshot(callback)
+#   client.batch(), client.transaction() with firestore.transactional,
+#   client.get_all(refs, transaction=...)
+#   SERVER_TIMESTAMP, Increment and DELETE_FIELD in written values
+#
+# Documents are stored as JSON, one row per document. nurse_id and
+# patient_id are copied into indexed columns; equality and range filters on
+# them, and ordering by patient_id, run in SQL. Everything else is filtered
+# in Python over the rows SQL returns.
+#
+# Snapshot listeners only see writes made through this process's client.
+import base64
+import copy
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+
+# Fields copied into their own indexed columns
+INDEXED_FIELDS = ('nurse_id', 'patient_id')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    nurse_id TEXT,
+    patient_id TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+)
+"""
+
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS documents_nurse ON documents (collection, nurse_id, patient_id)",
+    "CREATE INDEX IF NOT EXISTS documents_patient ON documents (collection, patient_id)",
+]
+
+_SQL_OPS = {'==': '=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+def _encode_value(value):
+    # Datetimes and packed responses round-trip through tagged JSON objects
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _decode_value(obj):
+    if set(obj) == {'__datetime__'}:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if set(obj) == {'__bytes__'}:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+def _dumps(data):
+    return json.dumps(data, default=_encode_value, sort_keys=True)
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_decode_value)
+
+
+def _resolve(value, current=None):
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.Increment):
+        return (current or 0) + value.value
+    if isinstance(value, dict):
+        current = current if isinstance(current, dict) else {}
+        return {k: _resolve(v, current.get(k)) for k, v in value.items() if v is not transforms.DELETE_FIELD}
+    return value
+
+
+def _merge(target, data):
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = _resolve(value, target.get(key))
+
+
+def _get_path(data, path):
+    for part in path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def _comparable(value):
+    # Firestore reads naive datetimes as UTC; stored datetimes are always aware
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _sort_key(value):
+    # Missing fields sort last, as Firestore leaves them out of ordered results
+    return (value is None, value)
+
+
+def _merge_changes(target, changed):
+    # Folds one write's {collection: {doc_id: data}} into target; later wins
+    for collection, docs in changed.items():
+        target.setdefault(collection, {}).update(docs)
+    return target
+
+
+class Snapshot:
+
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _get_path(self._data, field)
+
+
+class DocumentReference:
+
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self, *args, **kwargs):
+        return Snapshot(self, self._client._load(self._collection, self.id))
+
+    def _set_op(self, data, merge=False):
+        def apply(current):
+            if merge and current is not None:
+                _merge(current, data)
+                return current
+            return _resolve(data)
+        return (self._collection, self.id, apply)
+
+    def _update_op(self, fields):
+        def apply(current):
+            if current is None:
+                raise NotFound(f"No document to update: {self._collection}/{self.id}")
+            for path, value in fields.items():
+                parts = path.split('.')
+                target = current
+                for part in parts[:-1]:
+                    target = target.setdefault(part, {})
+                if value is transforms.DELETE_FIELD:
+                    target.pop(parts[-1], None)
+                else:
+                    target[parts[-1]] = _resolve(value, target.get(parts[-1]))
+            return current
+        return (self._collection, self.id, apply)
+
+    def _create_op(self, data):
+        def apply(current):
+            if current is not None:
+                raise AlreadyExists(f"Document already exists: {self._collection}/{self.id}")
+            return _resolve(data)
+        return (self._collection, self.id, apply)
+
+    def _delete_op(self):
+        return (self._collection, self.id, lambda current: None)
+
+    def create(self, data):
+        self._client._apply([self._create_op(data)])
+
+    def set(self, data, merge=False):
+        self._client._apply([self._set_op(data, merge)])
+
+    def update(self, fields):
+        self._client._apply([self._update_op(fields)])
+
+    def delete(self):
+        self._client._apply([self._delete_op()])
+
+
+class AggregationResult:
+
+    def __init__(self, value):
+        self.value = value
+
+
+class AggregationQuery:
+
+    def __init__(self, query):
+        self._query = query
+
+    def get(self, *args, **kwargs):
+        return [[AggregationResult(self._query._count())]]
+
+
+class Query:
+
+    def __init__(self, client, collection, filters=(), orders=(), limit=None, cursor=None):
+        self._client = client
+        self._collection = collection
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit, cursor=self._cursor)
+        state.update(changes)
+        return Query(self._client, self._collection, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + [(field, op, _comparable(value))])
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + [(field, direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, values):
+        if isinstance(values, Snapshot):
+            values = values.to_dict()
+        return self._copy(cursor=values)
+
+    def count(self):
+        return AggregationQuery(self)
+
+    def _sql(self):
+        # WHERE clause for the filters on indexed columns, and whether that
+        # covers every filter (so SQL can also order, page and count)
+        clauses = ["collection = ?"]
+        params = [self._collection]
+        covered = True
+        for field, op, value in self._filters:
+            if field in INDEXED_FIELDS and op in _SQL_OPS and isinstance(value, str):
+                clauses.append(f"{field} {_SQL_OPS[op]} ?")
+                params.append(value)
+            elif field in INDEXED_FIELDS and op == 'in' and value and all(isinstance(v, str) for v in value):
+                clauses.append(f"{field} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                covered = False
+        return clauses, params, covered
+
+    def _matches(self, data):
+        return all(_OPS[op](_get_path(data, field), value) for field, op, value in self._filters)
+
+    def _by_patient_id(self):
+        return self._orders in ([], [('patient_id', 'ASCENDING')])
+
+    def _matching(self, paged=True):
+        clauses, params, covered = self._sql()
+        if covered and self._by_patient_id():
+            # Fully answered by the indexes, including the cursor and limit
+            if paged and self._cursor is not None and self._orders:
+                clauses.append("patient_id > ?")
+                params.append(_get_path(self._cursor, 'patient_id'))
+            sql = f"SELECT id, data FROM documents WHERE {' AND '.join(clauses)} ORDER BY patient_id"
+            if paged and self._limit is not None:
+                sql += " LIMIT ?"
+                params.append(self._limit)
+            return [(doc_id, _loads(data)) for doc_id, data in self._client._query(sql, params)]
+
+        sql = f"SELECT id, data FROM documents WHERE {' AND '.join(clauses)}"
+        docs = [
+            (doc_id, data) for doc_id, data in ((doc_id, _loads(data)) for doc_id, data in self._client._query(sql, params))
+            if self._matches(data)
+        ]
+        for field, direction in reversed(self._orders):
+            docs.sort(key=lambda item: _sort_key(_get_path(item[1], field)), reverse=direction == 'DESCENDING')
+        if not paged:
+            return docs
+        if self._cursor is not None and self._orders:
+            keys = [field for field, _ in self._orders]
+            cursor = tuple(_get_path(self._cursor, key) for key in keys)
+            descending = self._orders[0][1] == 'DESCENDING'
+
+            def after(item):
+                values = tuple(_get_path(item[1], key) for key in keys)
+                return values < cursor if descending else values > cursor
+
+            docs = [item for item in docs if after(item)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return docs
+
+    def _count(self):
+        clauses, params, covered = self._sql()
+        if covered and self._cursor is None and self._limit is None:
+            return self._client._query(f"SELECT COUNT(*) FROM documents WHERE {' AND '.join(clauses)}", params)[0][0]
+        return len(self._matching())
+
+    def stream(self, *args, **kwargs):
+        for doc_id, data in self._matching():
+            yield Snapshot(DocumentReference(self._client, self._collection, doc_id), data)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        # Filters apply; ordering and limits are ignored, as listeners here only need membership
+        watch = Watch(self, callback)
+        with self._client._lock:
+            # Registered and scanned under the lock, so no write falls in between
+            self._client._watches.append(watch)
+            watch.start()
+        return watch
+
+
+class _ChangeType:
+
+    def __init__(self, name):
+        self.name = name
+
+
+class DocumentChange:
+
+    def __init__(self, kind, snapshot):
+        self.type = _ChangeType(kind)
+        self.document = snapshot
+
+
+class Watch:
+    # Scans the query once on subscribe; after that each write hands over the
+    # documents it changed, and only those are compared against the filters
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._collection = query._collection
+        self._callback = callback
+        self._known = {}
+
+    def _snapshot(self, doc_id, data):
+        return Snapshot(DocumentReference(self._query._client, self._collection, doc_id), data)
+
+    def start(self):
+        self._known = {doc_id: data for doc_id, data in self._query._matching(paged=False)}
+        changes = [DocumentChange('ADDED', self._snapshot(doc_id, data)) for doc_id, data in self._known.items()]
+        self._emit(changes)
+
+    def notify(self, docs):
+        # docs: {doc_id: data, or None if deleted} written to this collection
+        changes = []
+        for doc_id, data in docs.items():
+            before = self._known.get(doc_id)
+            if data is not None and self._query._matches(data):
+                if before == data:
+                    continue
+                self._known[doc_id] = data
+                changes.append(DocumentChange('ADDED' if before is None else 'MODIFIED', self._snapshot(doc_id, data)))
+            elif before is not None:
+                del self._known[doc_id]
+                changes.append(DocumentChange('REMOVED', self._snapshot(doc_id, None)))
+        if changes:
+            self._emit(changes)
+
+    def _emit(self, changes):
+        snapshots = [self._snapshot(doc_id, data) for doc_id, data in self._known.items()]
+        self._callback(snapshots, changes, datetime.now(timezone.utc))
+
+    def unsubscribe(self):
+        client = self._query._client
+        with client._lock:
+            if self in client._watches:
+                client._watches.remove(self)
+
+
+class CollectionReference(Query):
+
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, doc_id):
+        return DocumentReference(self._client, self._collection, doc_id)
+
+
+class WriteBatch:
+
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(ref._set_op(data, merge))
+
+    def update(self, ref, fields):
+        self._ops.append(ref._update_op(fields))
+
+    def delete(self, ref):
+        self._ops.append(ref._delete_op())
+
+    def commit(self):
+        # All writes land in one SQLite transaction
+        ops, self._ops = self._ops, []
+        self._client._apply(ops)
+        return []
+
+
+class Transaction(WriteBatch):
+    # Implements the hooks firestore.transactional calls. _begin takes the
+    # client lock and opens an IMMEDIATE transaction, so reads made through
+    # get_all see no concurrent writes until the staged writes are committed.
+
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, client):
+        super().__init__(client)
+        self._id = None
+
+    def _clean_up(self):
+        self._ops = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._client._lock.acquire()
+        try:
+            self._client._conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._client._lock.release()
+            raise
+        self._id = object()
+
+    def _finish(self, statement):
+        if statement == "ROLLBACK":
+            self._client._deferred = {}
+        try:
+            self._client._conn.execute(statement)
+        finally:
+            self._id = None
+            self._client._lock.release()
+
+    def _commit(self):
+        ops, self._ops = self._ops, []
+        try:
+            changed = self._client._write(ops)
+        except Exception:
+            self._finish("ROLLBACK")
+            raise
+        deferred, self._client._deferred = self._client._deferred, {}
+        self._finish("COMMIT")
+        self._client._notify(_merge_changes(deferred, changed))
+        return []
+
+    def _rollback(self):
+        self._ops = []
+        if self._id is not None:
+            self._finish("ROLLBACK")
+
+
+class SQLiteClient:
+
+    def __init__(self, path):
+        self.path = path
+        # One connection shared by every thread, serialized by the lock; the
+        # connection is left in autocommit mode and transactions are explicit
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.RLock()
+        self._watches = []
+        self._deferred = {}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+            for statement in _INDEXES:
+                self._conn.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, **kwargs):
+        return Transaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for ref in references:
+            yield ref.get()
+
+    def load_documents(self, collections):
+        # Bulk import of {collection: {doc_id: data}}, e.g. a Firestore export
+        # or benchmark seed data
+        self._apply([
+            (collection, doc_id, lambda current, data=data: _resolve(data))
+            for collection, docs in collections.items()
+            for doc_id, data in docs.items()
+        ])
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _load(self, collection, doc_id):
+        rows = self._query("SELECT data FROM documents WHERE collection = ? AND id = ?", (collection, doc_id))
+        return _loads(rows[0][0]) if rows else None
+
+    def _write(self, ops):
+        # Applies (collection, doc_id, apply(current) -> new or None) in order;
+        # the caller holds the lock and owns the surrounding transaction.
+        # Returns {collection: {doc_id: stored JSON, or None if deleted}}.
+        changed = {}
+        for collection, doc_id, apply in ops:
+            new = apply(self._load(collection, doc_id))
+            if new is None:
+                self._conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?", (collection, doc_id))
+                changed.setdefault(collection, {})[doc_id] = None
+            else:
+                indexed = [new.get(field) if isinstance(new.get(field), str) else None for field in INDEXED_FIELDS]
+                data = _dumps(new)
+                self._conn.execute(
+                    """
+                    INSERT INTO documents (collection, id, nurse_id, patient_id, data) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(collection, id) DO UPDATE SET
+                        nurse_id = excluded.nurse_id,
+                        patient_id = excluded.patient_id,
+                        data = excluded.data
+                    """,
+                    (collection, doc_id, *indexed, data),
+                )
+                changed.setdefault(collection, {})[doc_id] = data
+        return changed
+
+    def _apply(self, ops):
+        with self._lock:
+            nested = self._conn.in_transaction
+            if not nested:
+                self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed = self._write(ops)
+            except Exception:
+                if not nested:
+                    self._conn.execute("ROLLBACK")
+                raise
+            if not nested:
+                self._conn.execute("COMMIT")
+        if nested:
+            # Written inside an open transaction; reported when it commits
+            _merge_changes(self._deferred, changed)
+        else:
+            self._notify(changed)
+
+    def _notify(self, changed):
+        # Hands each watch the documents written to its collection, decoded
+        # once per collection
+        with self._lock:
+            watches = [w for w in self._watches if w._collection in changed]
+            docs = {
+                collection: {doc_id: _loads(data) if data is not None else None for doc_id, data in written.items()}
+                for collection, written in changed.items()
+                if any(w._collection == collection for w in watches)
+            }
+            for watch in watches:
+                watch.notify(docs[watch._collection])
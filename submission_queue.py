@@ -0,0 +1,255 @@
+# submission_queue.py
+# Write-behind queue for patient submissions. A submission is committed to a
+# local SQLite journal (WAL mode) and acknowledged straight away; a background
+# worker flushes the journal to Firestore in batches, retrying with backoff.
+#
+# The journal is keyed on patient_id, so resubmitting a patient before the
+# previous write reached Firestore replaces it rather than queueing both.
+#
+# Transient failures (Firestore unavailable, timeouts, a dropped network)
+# just back off and retry the batch; they don't count against submissions.
+# When a batch is rejected outright, its submissions are retried one at a
+# time so a single bad one can't hold up the rest; one that keeps being
+# rejected on its own is set aside after MAX_SUBMIT_ATTEMPTS tries, until it
+# is resubmitted or retried.
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import screening_stats
+
+SUBMISSION_JOURNAL = os.getenv('SUBMISSION_JOURNAL', 'submissions.db')
+
+# Firestore batch size per flush, and the retry backoff bounds in seconds
+FLUSH_BATCH_SIZE = int(os.getenv('FLUSH_BATCH_SIZE', '100'))
+RETRY_BACKOFF_MIN = 1.0
+RETRY_BACKOFF_MAX = 60.0
+
+# Rejected individual writes before a submission is set aside
+MAX_SUBMIT_ATTEMPTS = int(os.getenv('MAX_SUBMIT_ATTEMPTS', '10'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    patient_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+)
+"""
+
+
+def _encode_bytes(value):
+    # Packed responses are bytes, which JSON can't hold directly
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Cannot journal value of type {type(value).__name__}")
+
+
+def _decode_bytes(obj):
+    if set(obj) == {'__bytes__'}:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+def is_rejected(error):
+    # True when Firestore refused the data itself (e.g. an invalid value or
+    # document path), which retrying the same submission can't fix. Anything
+    # else is treated as transient.
+    from google.api_core.exceptions import InvalidArgument
+
+    return isinstance(error, (InvalidArgument, ValueError, TypeError))
+
+
+class SubmissionJournal:
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS submissions_enqueued ON submissions (enqueued_at)")
+
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across the
+        # Streamlit script threads and the flush worker
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def append(self, patient_data):
+        payload = {k: v for k, v in patient_data.items() if k != 'submitted_at'}
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO submissions (patient_id, payload, enqueued_at) VALUES (?, ?, ?)
+                ON CONFLICT(patient_id) DO UPDATE SET
+                    payload = excluded.payload,
+                    enqueued_at = excluded.enqueued_at,
+                    version = submissions.version + 1,
+                    attempts = 0,
+                    last_error = NULL
+                """,
+                (patient_data['patient_id'], json.dumps(payload, default=_encode_bytes), time.time()),
+            )
+
+    def pending(self, limit):
+        # Oldest first, skipping submissions that have been set aside
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT patient_id, payload, enqueued_at, version FROM submissions
+                WHERE attempts < ? ORDER BY enqueued_at LIMIT ?
+                """,
+                (MAX_SUBMIT_ATTEMPTS, limit),
+            ).fetchall()
+        return [
+            (patient_id, json.loads(payload, object_hook=_decode_bytes), enqueued_at, version)
+            for patient_id, payload, enqueued_at, version in rows
+        ]
+
+    def acknowledge(self, entries):
+        # Only remove the exact versions that were written; a newer
+        # resubmission that arrived mid-flush stays queued
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM submissions WHERE patient_id = ? AND version = ?",
+                [(patient_id, version) for patient_id, _, _, version in entries],
+            )
+
+    def record_failure(self, entries, error):
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE submissions SET attempts = attempts + 1, last_error = ? WHERE patient_id = ? AND version = ?",
+                [(str(error), patient_id, version) for patient_id, _, _, version in entries],
+            )
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM submissions WHERE attempts < ?", (MAX_SUBMIT_ATTEMPTS,)).fetchone()[0]
+
+    def failed(self):
+        # [(patient_id, last_error)] for submissions that have been set aside
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT patient_id, last_error FROM submissions WHERE attempts >= ? ORDER BY enqueued_at",
+                (MAX_SUBMIT_ATTEMPTS,),
+            ).fetchall()
+
+    def reset_failed(self):
+        with self._connect() as conn:
+            conn.execute("UPDATE submissions SET attempts = 0 WHERE attempts >= ?", (MAX_SUBMIT_ATTEMPTS,))
+
+
+class SubmissionQueue:
+
+    def __init__(self, db, journal):
+        self._db = db
+        self.journal = journal
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._backoff = RETRY_BACKOFF_MIN
+        self.last_error = None
+        self._worker = threading.Thread(target=self._run, name="submission-flush", daemon=True)
+        self._worker.start()
+
+    def submit(self, patient_data):
+        self.journal.append(patient_data)
+        self._wake.set()
+
+    def pending_count(self):
+        return self.journal.count()
+
+    def failed(self):
+        return self.journal.failed()
+
+    def retry_failed(self):
+        self.journal.reset_failed()
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._worker.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                flushed = self.flush()
+            except Exception as e:
+                self.last_error = e
+                self._stop.wait(self._backoff)
+                self._backoff = min(self._backoff * 2, RETRY_BACKOFF_MAX)
+                continue
+
+            self._backoff = RETRY_BACKOFF_MIN
+            self.last_error = None
+            if not flushed:
+                self._wake.wait()
+                self._wake.clear()
+
+    def flush(self):
+        # Writes one batch; returns how many submissions reached Firestore
+        entries = self.journal.pending(FLUSH_BATCH_SIZE)
+        if not entries:
+            return 0
+
+        try:
+            self._write(entries)
+        except Exception as e:
+            if not is_rejected(e):
+                raise
+            if len(entries) == 1:
+                self.journal.record_failure(entries, e)
+                raise
+            return self._flush_each(entries)
+
+        self.journal.acknowledge(entries)
+        return len(entries)
+
+    def _flush_each(self, entries):
+        # The batch was rejected as a whole; find out which submissions are at
+        # fault. A transient failure stops the pass and the batch is retried.
+        written = 0
+        error = None
+        for entry in entries:
+            try:
+                self._write([entry])
+            except Exception as e:
+                if not is_rejected(e):
+                    raise
+                self.journal.record_failure([entry], e)
+                error = e
+                continue
+            self.journal.acknowledge([entry])
+            written += 1
+        if not written:
+            raise error
+        return written
+
+    def _write(self, entries):
+        payloads = []
+        for patient_id, payload, enqueued_at, _ in entries:
+            payload['submitted_at'] = datetime.fromtimestamp(enqueued_at, timezone.utc)
+            payloads.append(payload)
+        # One transaction: patient documents, draft deletes and statistics
+        # counters all land together or not at all, so a retry after a
+        # failure can't double-count
+        screening_stats.write_submissions(self._db, payloads)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_submission_queue(db):
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SubmissionQueue(db, SubmissionJournal(SUBMISSION_JOURNAL))
+        return _queue
@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import qa_store
+from question_dedup import QuestionDedupIndex, dedup_questions, find_clusters
+from sqlite_store import SQLiteClient
+
+QUESTION = "Can a patient with type 2 diabetes on insulin be enrolled?"
+REWORDED = "Can patients with type 2 diabetes on insulin be enrolled?"
+OTHER_NUMBER = "Can a patient with type 1 diabetes on insulin be enrolled?"
+UNRELATED = "Are smokers excluded from the trial?"
+
+
+def _question(qid, question, answer=None, day=1, **extra):
+    return {
+        'id': qid,
+        'question': question,
+        'answer': answer,
+        'answered': answer is not None,
+        'created_at': datetime(2025, 1, day, tzinfo=timezone.utc),
+        **extra,
+    }
+
+
+def test_similar_needs_close_wording_and_the_same_numbers():
+    index = QuestionDedupIndex()
+    index.add('q1', [QUESTION], {'id': 'q1'})
+    index.add('q2', [UNRELATED], {'id': 'q2'})
+
+    assert [payload['id'] for _, payload in index.similar(REWORDED)] == ['q1']
+    assert index.similar(OTHER_NUMBER) == []
+    assert index.similar(REWORDED, exclude='q1') == []
+
+
+def test_similar_scores_the_best_matching_wording():
+    # Merged variants must not dilute how well the original wording matches
+    index = QuestionDedupIndex()
+    index.add('q1', [
+        QUESTION,
+        "What about people who use insulin pumps for their type 2 diabetes, can they join?",
+        "Type 2 diabetic on basal insulin, eligible or not?",
+        "Insulin-dependent type 2 diabetes: enrol?",
+        "Patients on insulin with type 2 diabetes mellitus allowed?",
+    ], {'id': 'q1'})
+
+    ((score, payload),) = index.similar(QUESTION)
+    assert payload['id'] == 'q1'
+    assert score == 1.0
+
+    index.remove('q1')
+    assert index.similar(QUESTION) == []
+
+
+def test_find_clusters_puts_the_answered_question_first():
+    questions = [
+        _question('q1', QUESTION, day=1),
+        _question('q2', REWORDED, answer="Yes, if HbA1c is below 9%.", day=2),
+        _question('q3', OTHER_NUMBER, day=3),
+        _question('q4', UNRELATED, day=4),
+    ]
+    clusters = find_clusters(questions)
+    assert [[item['id'] for item in cluster] for cluster in clusters] == [['q2', 'q1']]
+
+
+@pytest.fixture
+def db(tmp_path):
+    client = SQLiteClient(str(tmp_path / "store.db"))
+    yield client
+    client.close()
+
+
+def _store(db, *questions):
+    for item in questions:
+        data = dict(item)
+        db.collection(qa_store.QUESTIONS_COLLECTION).document(data.pop('id')).set(data)
+
+
+def test_dedup_merges_but_keeps_different_answers_apart(db):
+    _store(
+        db,
+        _question('q1', QUESTION, answer="Yes.", day=1),
+        _question('q2', REWORDED, day=2),
+        _question('q3', UNRELATED, answer="Yes.", day=3),
+        _question('q4', "Are smokers excluded from this trial?", answer="No.", day=4),
+    )
+    dedup_questions(db, apply=True)
+
+    stored = {s.id: s.to_dict() for s in db.collection(qa_store.QUESTIONS_COLLECTION).stream()}
+    assert sorted(stored) == ['q1', 'q3', 'q4']
+    assert stored['q1']['variants'] == [REWORDED]
+    assert stored['q1']['raised_count'] == 2
+    assert (stored['q3']['answer'], stored['q4']['answer']) == ("Yes.", "No.")
+
+    with pytest.raises(ValueError):
+        qa_store.merge_questions(db, {'id': 'q3', **stored['q3']}, [{'id': 'q4', **stored['q4']}])
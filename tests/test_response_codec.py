@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import response_codec
+from criteria import response_keys
+
+
+def _all_answers():
+    cycle = ["yes", "no", "not sure"]
+    return {key: cycle[i % 3] for i, key in enumerate(response_keys)}
+
+
+def test_full_assessment_packs_into_13_bytes():
+    assert len(response_keys) == 49
+    assert len(response_codec.pack(_all_answers())) == 13
+
+
+def test_pack_unpack_round_trip():
+    responses = _all_answers()
+    assert response_codec.unpack(response_codec.pack(responses)) == responses
+
+
+def test_missing_and_unrecognised_answers_are_dropped():
+    responses = {response_keys[0]: "Yes ", response_keys[1]: "maybe", response_keys[2]: None}
+    assert response_codec.unpack(response_codec.pack(responses)) == {response_keys[0]: "yes"}
+
+
+def test_codes_matrix_matches_unpack():
+    rows = [
+        _all_answers(),
+        {key: "no" for key in response_keys},
+        {response_keys[-1]: "not sure"},
+    ]
+    matrix = response_codec.codes_matrix([response_codec.pack(r) for r in rows])
+    assert matrix.shape == (3, 49)
+
+    answers = {response_codec.YES: "yes", response_codec.NO: "no", response_codec.NOT_SURE: "not sure"}
+    for row, responses in zip(matrix, rows):
+        decoded = {key: answers[code] for key, code in zip(response_keys, row) if code != response_codec.MISSING}
+        assert decoded == responses
+
+
+def test_codes_matrix_of_no_rows():
+    assert response_codec.codes_matrix([]).shape == (0, 49)
+
+
+def test_unknown_criteria_version():
+    with pytest.raises(ValueError):
+        response_codec.unpack(b"\x00" * 13, version=99)
+
+
+def test_read_responses_handles_both_formats():
+    responses = _all_answers()
+    legacy = {'responses': responses}
+    packed = response_codec.encode_document(legacy)
+    assert response_codec.is_legacy(legacy)
+    assert not response_codec.is_legacy(packed)
+    assert response_codec.read_responses(packed) == response_codec.read_responses(legacy) == responses
+    assert np.array_equal(
+        response_codec.codes_matrix([response_codec.read_packed(legacy)]),
+        response_codec.codes_matrix([response_codec.read_packed(packed)]),
+    )
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import response_codec
+import screening
+from criteria import exclusion_keys, inclusion_keys, response_keys
+from sqlite_store import SQLiteClient
+
+
+def _responses(answer="no", **overrides):
+    return {**{key: answer for key in response_keys}, **overrides}
+
+
+def test_evaluate():
+    matrix = screening.encode_responses([
+        _responses(),
+        _responses(**{exclusion_keys[0]: "yes"}),
+        _responses(**{inclusion_keys[0]: "not sure"}),
+        # Not sure wins over an answered-yes exclusion
+        _responses(**{exclusion_keys[0]: "yes", inclusion_keys[0]: "not sure"}),
+        {key: "no" for key in response_keys[:-1]},
+    ])
+    assert list(screening.evaluate(matrix)) == [
+        screening.ELIGIBLE, screening.EXCLUDED, screening.UNCONCLUDED, screening.UNCONCLUDED, screening.UNCONCLUDED,
+    ]
+
+
+def test_encode_documents_reads_both_formats():
+    responses = _responses(**{exclusion_keys[1]: "yes", inclusion_keys[2]: "not sure"})
+    legacy = {'responses': responses}
+    packed = response_codec.encode_document(legacy)
+
+    matrix = screening.encode_documents([legacy, packed])
+    assert np.array_equal(matrix[0], matrix[1])
+    assert np.array_equal(matrix[0], screening.encode_responses([responses])[0])
+    assert screening.encode_documents([]).shape == (0, len(response_keys))
+
+
+@pytest.fixture
+def db(tmp_path):
+    client = SQLiteClient(str(tmp_path / "store.db"))
+    yield client
+    client.close()
+
+
+def _log_rows(*patient_ids):
+    return [{'patient_id': p, 'nurse_id': 'N1', 'subject_name': f"Subject {p}", **_responses()} for p in patient_ids]
+
+
+def test_ingest_skips_existing_and_invalid_ids(db, tmp_path):
+    db.collection('PATIENTS').document('P1').set({'patient_id': 'P1', 'subject_name': 'kept'})
+    path = tmp_path / "log.csv"
+    pd.DataFrame(_log_rows('P1', 'P2', 'a/b', '__x__', '')).to_csv(path, index=False)
+
+    written, skipped, invalid = screening.ingest_screening_log(db, str(path))
+
+    assert written == 1
+    assert skipped == ['P1']
+    assert [patient_id for patient_id, _ in invalid] == ['a/b', '__x__', '']
+    assert db.collection('PATIENTS').document('P1').get().to_dict() == {'patient_id': 'P1', 'subject_name': 'kept'}
+    stored = db.collection('PATIENTS').document('P2').get().to_dict()
+    assert stored['conclusion'] == screening.ELIGIBLE
+    assert response_codec.read_responses(stored) == _responses()
+
+
+def test_parquet_values_are_read_as_text(tmp_path):
+    pytest.importorskip("pyarrow")
+    rows = _log_rows('x', 'y')
+    frame = pd.DataFrame(rows)
+    frame['patient_id'] = [1001.0, 1002.0]
+    frame['subject_name'] = [None, "Jane"]
+    path = tmp_path / "log.parquet"
+    frame.to_parquet(path)
+
+    patients = screening.load_screening_log(str(path))
+    assert [p['patient_id'] for p in patients] == ['1001', '1002']
+    assert [p['subject_name'] for p in patients] == ['', 'Jane']
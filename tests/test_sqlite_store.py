@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+
+import pytest
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+from sqlite_store import SQLiteClient
+
+
+@pytest.fixture
+def db(tmp_path):
+    client = SQLiteClient(str(tmp_path / "store.db"))
+    yield client
+    client.close()
+
+
+def _patient(patient_id, nurse_id, **extra):
+    return {'patient_id': patient_id, 'nurse_id': nurse_id, **extra}
+
+
+def test_set_get_round_trips_datetimes_and_bytes(db):
+    submitted = datetime(2025, 1, 1, 12, 30, tzinfo=timezone.utc)
+    ref = db.collection('PATIENTS').document('P1')
+    ref.set(_patient('P1', 'N1', submitted_at=submitted, responses_packed=b'\x01\x02'))
+
+    snapshot = ref.get()
+    assert snapshot.exists
+    assert snapshot.to_dict() == _patient('P1', 'N1', submitted_at=submitted, responses_packed=b'\x01\x02')
+    assert not db.collection('PATIENTS').document('missing').get().exists
+
+
+def test_merge_update_and_transforms(db):
+    ref = db.collection('STATS').document('shard')
+    ref.set({'total': 1, 'conclusions': {'Eligible': 1}, 'stale': True})
+    ref.set({'total': firestore.Increment(2), 'conclusions': {'Excluded': 1}}, merge=True)
+    ref.update({'conclusions.Eligible': firestore.Increment(1), 'stale': firestore.DELETE_FIELD})
+
+    assert ref.get().to_dict() == {'total': 3, 'conclusions': {'Eligible': 2, 'Excluded': 1}}
+
+    ref.set({'updated_at': firestore.SERVER_TIMESTAMP}, merge=True)
+    assert isinstance(ref.get().get('updated_at'), datetime)
+
+
+def test_update_of_missing_document_fails(db):
+    with pytest.raises(NotFound):
+        db.collection('PATIENTS').document('missing').update({'conclusion': 'Eligible'})
+
+
+def test_indexed_query_with_cursor_limit_and_count(db):
+    patients = db.collection('PATIENTS')
+    for patient_id in ['P3', 'P1', 'P4', 'P2']:
+        patients.document(patient_id).set(_patient(patient_id, 'N1'))
+    patients.document('Q1').set(_patient('Q1', 'N2'))
+
+    query = patients.where('nurse_id', '==', 'N1').order_by('patient_id')
+    assert [s.id for s in query.limit(2).stream()] == ['P1', 'P2']
+    assert [s.id for s in query.start_after({'patient_id': 'P2'}).limit(2).stream()] == ['P3', 'P4']
+    assert query.count().get()[0][0].value == 4
+
+
+def test_unindexed_filters_and_ordering(db):
+    questions = db.collection('QUESTIONS')
+    for i, answered in enumerate([True, False, True]):
+        questions.document(f'q{i}').set({'answered': answered, 'created_at': datetime(2025, 1, 1 + i, tzinfo=timezone.utc)})
+
+    query = questions.where('answered', '==', True).order_by('created_at', direction='DESCENDING')
+    assert [s.id for s in query.stream()] == ['q2', 'q0']
+    # Naive datetimes compare as UTC, as in Firestore
+    assert [s.id for s in questions.where('created_at', '>', datetime(2025, 1, 2)).stream()] == ['q2']
+
+
+def test_failed_batch_writes_nothing(db):
+    batch = db.batch()
+    batch.set(db.collection('PATIENTS').document('P1'), _patient('P1', 'N1'))
+    batch.update(db.collection('PATIENTS').document('missing'), {'conclusion': 'Eligible'})
+    with pytest.raises(NotFound):
+        batch.commit()
+    assert not db.collection('PATIENTS').document('P1').get().exists
+
+
+def test_transaction_reads_and_writes(db):
+    ref = db.collection('STATS').document('shard')
+    ref.set({'total': 1})
+
+    @firestore.transactional
+    def bump(transaction):
+        (snapshot,) = db.get_all([ref], transaction=transaction)
+        transaction.set(ref, {'total': snapshot.get('total') + 1})
+
+    bump(db.transaction())
+    assert ref.get().get('total') == 2
+
+
+class _Recorder:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, snapshots, changes, read_time):
+        self.calls.append((sorted(s.id for s in snapshots), sorted((c.type.name, c.document.id) for c in changes)))
+
+
+def test_watch_reports_only_changed_documents(db):
+    patients = db.collection('PATIENTS')
+    patients.document('P1').set(_patient('P1', 'N1'))
+    patients.document('P2').set(_patient('P2', 'N1'))
+    patients.document('Q1').set(_patient('Q1', 'N2'))
+
+    recorder = _Recorder()
+    watch = patients.where('nurse_id', '==', 'N1').on_snapshot(recorder)
+    assert recorder.calls == [(['P1', 'P2'], [('ADDED', 'P1'), ('ADDED', 'P2')])]
+
+    patients.document('P3').set(_patient('P3', 'N1'))
+    patients.document('P1').set({'conclusion': 'Eligible'}, merge=True)
+    patients.document('Q2').set(_patient('Q2', 'N2'))            # outside the filter
+    patients.document('P2').set(_patient('P2', 'N1'))            # unchanged
+    patients.document('P3').set(_patient('P3', 'N2'))            # leaves the filter
+    patients.document('P1').delete()
+    assert recorder.calls[1:] == [
+        (['P1', 'P2', 'P3'], [('ADDED', 'P3')]),
+        (['P1', 'P2', 'P3'], [('MODIFIED', 'P1')]),
+        (['P1', 'P2'], [('REMOVED', 'P3')]),
+        (['P2'], [('REMOVED', 'P1')]),
+    ]
+
+    watch.unsubscribe()
+    patients.document('P4').set(_patient('P4', 'N1'))
+    assert len(recorder.calls) == 5
+
+
+def test_watch_sees_transaction_writes_once_committed(db):
+    recorder = _Recorder()
+    db.collection('PATIENTS').on_snapshot(recorder)
+    ref = db.collection('PATIENTS').document('P1')
+
+    @firestore.transactional
+    def submit(transaction):
+        list(db.get_all([ref], transaction=transaction))
+        transaction.set(ref, _patient('P1', 'N1'))
+        assert len(recorder.calls) == 1
+
+    submit(db.transaction())
+    assert recorder.calls[-1] == (['P1'], [('ADDED', 'P1')])
@@ -0,0 +1,89 @@
+import pytest
+from google.api_core.exceptions import InvalidArgument, ServiceUnavailable
+
+import submission_queue
+from submission_queue import SubmissionJournal, SubmissionQueue
+
+
+class _Writer:
+    # Stands in for screening_stats.write_submissions; fails batches that
+    # contain a rejected patient, or everything while the network is down
+
+    def __init__(self):
+        self.batches = []
+        self.rejected = set()
+        self.offline = False
+
+    def __call__(self, db, payloads):
+        ids = [p['patient_id'] for p in payloads]
+        if self.offline:
+            raise ServiceUnavailable("unreachable")
+        if self.rejected.intersection(ids):
+            raise InvalidArgument("bad value")
+        self.batches.append(ids)
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = _Writer()
+    monkeypatch.setattr(submission_queue.screening_stats, 'write_submissions', writer)
+    return writer
+
+
+@pytest.fixture
+def queue(tmp_path, writer):
+    queue = SubmissionQueue(None, SubmissionJournal(str(tmp_path / "journal.db")))
+    # Flushed by hand below instead of by the worker
+    queue.stop()
+    return queue
+
+
+def _submit(queue, *patient_ids):
+    for patient_id in patient_ids:
+        queue.journal.append({'patient_id': patient_id, 'nurse_id': 'N1', 'conclusion': 'Eligible'})
+
+
+def test_transient_failure_backs_off_without_counting_attempts(queue, writer, monkeypatch):
+    monkeypatch.setattr(submission_queue, 'MAX_SUBMIT_ATTEMPTS', 2)
+    _submit(queue, 'P1', 'P2', 'P3')
+    writer.offline = True
+    for _ in range(5):
+        with pytest.raises(ServiceUnavailable):
+            queue.flush()
+    assert queue.pending_count() == 3
+    assert queue.failed() == []
+
+    writer.offline = False
+    assert queue.flush() == 3
+    assert writer.batches == [['P1', 'P2', 'P3']]
+    assert queue.pending_count() == 0
+
+
+def test_rejected_submission_is_set_aside_and_retried(queue, writer, monkeypatch):
+    monkeypatch.setattr(submission_queue, 'MAX_SUBMIT_ATTEMPTS', 2)
+    _submit(queue, 'P1', 'P2', 'P3')
+    writer.rejected = {'P2'}
+
+    # The batch is split and the others still get through
+    assert queue.flush() == 2
+    assert writer.batches == [['P1'], ['P3']]
+    with pytest.raises(InvalidArgument):
+        queue.flush()
+    assert queue.pending_count() == 0
+    assert [patient_id for patient_id, _ in queue.failed()] == ['P2']
+
+    writer.rejected = set()
+    queue.retry_failed()
+    assert queue.flush() == 1
+    assert queue.failed() == []
+
+
+def test_acknowledge_keeps_newer_resubmission(queue, writer):
+    _submit(queue, 'P1')
+    entries = queue.journal.pending(10)
+    queue.journal.append({'patient_id': 'P1', 'nurse_id': 'N1', 'conclusion': 'Excluded'})
+    queue.journal.acknowledge(entries)
+
+    (remaining,) = queue.journal.pending(10)
+    assert remaining[1]['conclusion'] == 'Excluded'
+    assert remaining[3] == entries[0][3] + 1